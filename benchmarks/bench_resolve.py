@@ -0,0 +1,51 @@
+"""
+Time Resolver.resolve against synthetic sources of increasing size.
+
+Run it with::
+
+    $ python -m benchmarks.bench_resolve
+
+The sources come from ``benchmarks.synthetic``, where structs refer to other
+structs inline and as multiples and packets use structs, clones and unions,
+so lookups by name happen for most fields. The time per struct should stay
+roughly flat as the number of structs grows.
+"""
+from photons_messages_generator.adjustments import Adjustments
+from photons_messages_generator.generate import normalise
+from photons_messages_generator.resolver import Resolver
+
+from benchmarks.synthetic import synthetic_protocol
+
+from delfick_project.norms import Meta
+import argparse
+import time
+
+
+def time_resolve(num_structs):
+    src, adjustments = synthetic_protocol(num_structs)
+    src = normalise(src)
+    adjustments = Adjustments.FieldSpec().normalise(Meta({}, []).at("adjustments"), adjustments)
+
+    start = time.perf_counter()
+    Resolver(src, adjustments).resolve()
+    return time.perf_counter() - start
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Resolver scaling benchmark")
+    parser.add_argument("--max-structs", type=int, default=10000)
+    args = parser.parse_args(argv)
+
+    sizes = []
+    size = args.max_structs
+    while size >= 1000 and len(sizes) < 4:
+        sizes.insert(0, size)
+        size //= 2
+
+    for size in sizes:
+        took = time_resolve(size)
+        print(f"{size:>6} structs: {took:.3f}s ({took / size * 1e6:.1f}us per struct)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+"""
+Time each phase of generating messages for a synthetic protocol.
+
+Run it from the root of the repository::
+
+    $ python -m benchmarks.run --size 2000 --save-baseline before
+    ... make changes ...
+    $ python -m benchmarks.run --size 2000 --compare before
+
+Each phase is run ``--repeat`` times and the fastest time is kept. Comparing
+against a baseline exits with a non zero status if any phase got slower by
+more than ``--tolerance``. Phases that take less than ``--min-seconds`` in the
+baseline are reported but never count as a regression because they are too
+small to time reliably.
+"""
+from benchmarks.synthetic import synthetic_protocol
+
+from photons_messages_generator.generate import generate_to_memory
+from photons_messages_generator.profiling import Profile
+from photons_messages_generator.loader import load_yaml
+
+from ruamel.yaml import YAML
+import argparse
+import json
+import sys
+import io
+import os
+
+this_dir = os.path.dirname(__file__)
+
+
+def dump_yaml(document):
+    buf = io.StringIO()
+    yaml = YAML(typ="safe")
+    yaml.representer.ignore_aliases = lambda *args: True
+    yaml.dump(document, buf)
+    return buf.getvalue()
+
+
+def run_once(src_content, adjustments_content, jobs):
+    profile = Profile()
+
+    with profile.phase("load.src"):
+        src = load_yaml(src_content, name="synthetic src")
+    with profile.phase("load.adjustments"):
+        adjustments = load_yaml(adjustments_content, name="synthetic adjustments")
+
+    generate_to_memory(src, adjustments, jobs=jobs, profile=profile)
+    return profile
+
+
+def run(size, repeat, jobs):
+    src, adjustments = synthetic_protocol(size)
+    src_content = dump_yaml(src)
+    adjustments_content = dump_yaml(adjustments)
+
+    phases = {}
+    counts = {}
+    for _ in range(repeat):
+        profile = run_once(src_content, adjustments_content, jobs)
+        counts = profile.counts
+        for phase in profile.phases:
+            name = phase["name"]
+            phases[name] = min(phases.get(name, phase["seconds"]), phase["seconds"])
+
+    return {"size": size, "jobs": jobs, "counts": counts, "phases": phases}
+
+
+def baseline_path(folder, name):
+    return os.path.join(folder, f"{name}.json")
+
+
+def compare(result, baseline, tolerance, min_seconds):
+    if (baseline["size"], baseline["jobs"]) != (result["size"], result["jobs"]):
+        print(
+            f"Baseline was made with size={baseline['size']} jobs={baseline['jobs']}",
+            file=sys.stderr,
+        )
+        return False
+
+    ok = True
+    print(f"{'phase':<40} {'baseline':>10} {'now':>10} {'change':>8}")
+    for name, seconds in result["phases"].items():
+        before = baseline["phases"].get(name)
+        if before is None:
+            print(f"{name:<40} {'-':>10} {seconds:>10.4f} {'new':>8}")
+            continue
+
+        change = (seconds - before) / before if before else 0
+        marker = ""
+        if before >= min_seconds and change > tolerance:
+            marker = "  REGRESSION"
+            ok = False
+        print(f"{name:<40} {before:>10.4f} {seconds:>10.4f} {change:>+8.1%}{marker}")
+
+    return ok
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark generating a synthetic protocol")
+    parser.add_argument("--size", type=int, default=1000, help="Number of structs and packets")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--jobs", type=int, default=1)
+    parser.add_argument("--baselines", default=os.path.join(this_dir, "baselines"))
+    parser.add_argument("--save-baseline", help="Store the result under this name")
+    parser.add_argument("--compare", help="Compare the result with the baseline of this name")
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    parser.add_argument("--min-seconds", type=float, default=0.005)
+    parser.add_argument("--json", action="store_true", help="Print the result as json")
+    args = parser.parse_args(argv)
+
+    result = run(args.size, args.repeat, args.jobs)
+
+    if args.json:
+        print(json.dumps(result, indent=2))
+    elif not args.compare:
+        for name, seconds in result["phases"].items():
+            print(f"{name:<40} {seconds:>10.4f}")
+
+    if args.save_baseline:
+        os.makedirs(args.baselines, exist_ok=True)
+        with open(baseline_path(args.baselines, args.save_baseline), "w") as fle:
+            json.dump(result, fle, indent=2, sort_keys=True)
+
+    if args.compare:
+        with open(baseline_path(args.baselines, args.compare)) as fle:
+            baseline = json.load(fle)
+        if not compare(result, baseline, args.tolerance, args.min_seconds):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
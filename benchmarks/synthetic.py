@@ -0,0 +1,174 @@
+"""
+Synthetic protocol definitions for benchmarks.
+
+``synthetic_protocol(size)`` returns a src and adjustments document that use
+most of what the generator understands:
+
+* enums, some renamed and one used to switch unions
+* structs where most refer to a "leaf" struct both inline and as ``[k]``
+  multiples, with leaf structs that have multi options and clones
+* unions used by packets with a switch field
+* packets over many namespaces with multiples, bits, special types, struct
+  overrides with clones and ``using``
+
+Sizes in bytes are consistent with the fields so the result is valid input.
+"""
+from photons_messages_generator.helpers import camel_to_snake
+
+LEAF_EVERY = 10
+
+
+def leaf_for(i):
+    return (i // LEAF_EVERY) * LEAF_EVERY
+
+
+def synthetic_protocol(size):
+    num_enums = max(1, size // 10)
+    num_unions = max(1, size // 50)
+    num_namespaces = max(1, size // 100)
+
+    src = {"enums": {}, "fields": {}, "unions": {}, "packets": {}}
+    changes = {}
+    clones = {}
+
+    for i in range(num_enums):
+        name = f"Enum{i}"
+        prefix = camel_to_snake(name).upper()
+        src["enums"][name] = {
+            "type": "uint8",
+            "values": [
+                {"name": f"{prefix}_ONE", "value": 1},
+                {"name": f"{prefix}_TWO", "value": 2},
+                {"name": "reserved", "value": 3},
+                {"name": f"{prefix}_FOUR", "value": 4},
+            ],
+        }
+        if i % 2 == 0:
+            changes[name] = {"rename": f"Kind{i}"}
+
+    union_enum = "Kind0"
+
+    for i in range(size):
+        name = f"Struct{i}"
+        fields = [
+            {"name": "Value", "type": "uint16", "size_bytes": 2},
+            {"name": "Kind", "type": f"<Enum{i % num_enums}>", "size_bytes": 1},
+            {"name": "Flags", "type": "uint8", "size_bytes": 1},
+            {"type": "reserved", "size_bytes": 2},
+        ]
+        size_bytes = 6
+
+        if i == leaf_for(i):
+            changes[name] = {"multi_options": {"name": f"Leaf{i}"}}
+            clones[f"optional_leaf{i}"] = {
+                "cloning": name,
+                "multi_options": {"name": f"OptionalLeaf{i}"},
+                "fields": {"Value": {"more_extras": ["optional()"]}},
+            }
+        else:
+            leaf = leaf_for(i)
+            fields.append({"name": "Leaf", "type": f"<Struct{leaf}>", "size_bytes": 6})
+            fields.append({"name": "Leaves", "type": f"[2]<Struct{leaf}>", "size_bytes": 12})
+            size_bytes += 18
+            changes[name] = {
+                "fields": {"Flags": {"bits": [f"Option{b}" for b in range(8)]}},
+            }
+
+        src["fields"][name] = {"size_bytes": size_bytes, "fields": fields}
+
+    for i in range(num_unions):
+        src["unions"][f"Union{i}"] = {
+            "size_bytes": 4,
+            "fields": [
+                {"name": "One", "type": "uint32", "size_bytes": 4},
+                {"name": "Two", "type": "[2]uint16", "size_bytes": 4},
+            ],
+        }
+
+    pkt_type = 1
+    for n in range(num_namespaces):
+        namespace = f"bench{n}"
+        camel = namespace.capitalize()
+        packets = src["packets"][namespace] = {}
+
+        for i in range(n, size, num_namespaces):
+            leaf = leaf_for(i)
+
+            set_name = f"{camel}SetThing{i}"
+            packets[set_name] = {
+                "pkt_type": pkt_type,
+                "size_bytes": 30,
+                "fields": [
+                    {"name": "Item", "type": f"<Struct{leaf}>", "size_bytes": 6},
+                    {"name": "Color", "type": f"<Struct{leaf}>", "size_bytes": 6},
+                    {"name": "Values", "type": "[4]uint16", "size_bytes": 8},
+                    {"name": "Flags", "type": "uint8", "size_bytes": 1},
+                    {"type": "reserved", "size_bits": 8},
+                    {"name": "Duration", "type": "uint32", "size_bytes": 4},
+                    {"name": "Label", "type": "[4]byte", "size_bytes": 4},
+                ],
+            }
+            changes[set_name] = {
+                "fields": {
+                    "Color": {"override_struct": f"optional_leaf{leaf}"},
+                    "Flags": {"bits": [f"Flag{b}" for b in range(8)]},
+                    "Duration": {"special_type": "duration_type"},
+                    "Label": {"string_type": True},
+                },
+            }
+
+            state_name = f"{camel}StateThing{i}"
+            packets[state_name] = dict(packets[set_name], pkt_type=pkt_type + 1)
+            changes[state_name] = {"using": set_name}
+
+            get_name = f"{camel}GetThing{i}"
+            packets[get_name] = {
+                "pkt_type": pkt_type + 2,
+                "size_bytes": 5,
+                "fields": [
+                    {"name": "Kind", "type": f"<Enum{0}>", "size_bytes": 1},
+                    {"name": "Payload", "type": f"<Union{i % num_unions}>", "size_bytes": 4},
+                ],
+            }
+            changes[get_name] = {
+                "fields": {
+                    "Payload": {
+                        "rename": "body",
+                        "union_enum": union_enum,
+                        "union_switch_field": "kind",
+                    }
+                },
+            }
+
+            pkt_type += 3
+
+    output = [
+        {"create": "enums", "dest": "enums.py"},
+        {"create": "fields", "dest": "fields.py"},
+    ]
+    for n in range(num_namespaces):
+        output.append(
+            {
+                "create": "packets",
+                "dest": ["messages", f"bench{n}.py"],
+                "options": {"include": f"bench{n}"},
+            }
+        )
+
+    adjustments = {
+        "num_reserved_fields_in_frame": 3,
+        "invalid_field_names": ["payload", "fields"],
+        "types": {
+            "duration_type": {
+                "type": "uint32",
+                "size_bits": 32,
+                "default": "0",
+                "extras": ["allow_float()"],
+            }
+        },
+        "clones": clones,
+        "changes": changes,
+        "output": output,
+    }
+
+    return src, adjustments
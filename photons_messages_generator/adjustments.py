@@ -1,5 +1,5 @@
 from photons_messages_generator.helpers import camel_to_snake, valid_struct_types
-from photons_messages_generator.src import struct_field_spec
+from photons_messages_generator.fast_src import StructField
 from photons_messages_generator import field_types as ft
 from photons_messages_generator import errors
 
@@ -23,17 +23,15 @@ class SpecialType(dictobj.Spec):
     extras = dictobj.Field(sb.listof(sb.string_spec()))
 
     def format(self, in_fields=False):
-        meta = Meta({}, []).at("special_types").at(self.name)
-        field = struct_field_spec().normalise(
-            meta,
-            dict(
-                name=self.name,
-                full_name=self.name,
-                type=self.type,
-                size_bits=self.size_bits,
-                default=self.default,
-                extras=self.extras,
-            ),
+        field = StructField(
+            self.name,
+            self.name,
+            self.type,
+            self.type,
+            self.size_bits,
+            sb.NotSpecified,
+            self.default,
+            self.extras,
         )
         field.type = ft.SimpleType(self.type, self.multiples)
         return field.format(type_only=True, in_fields=in_fields)
@@ -101,6 +99,35 @@ class AdjustField(dictobj.Spec):
     special_type = dictobj.NullableField(sb.string_spec)
 
 
+class FieldAdjustment:
+    """
+    The adjustments for one field as plain attributes
+
+    Made by ``Adjustments.compile_field_adjustments`` so the resolver doesn't
+    have to look through ``changes`` every time it wants something about a field.
+    """
+
+    __slots__ = (
+        "rename",
+        "default",
+        "extras",
+        "union_enum",
+        "union_switch_field",
+        "allow_unknown_enums",
+        "bits",
+    )
+
+    def __init__(self, field):
+        for attr in self.__slots__:
+            setattr(self, attr, field[attr])
+
+
+# What we use for fields that have no adjustments
+no_field_adjustment = FieldAdjustment(
+    AdjustField.FieldSpec().normalise(Meta({}, []).at("no_field_adjustment"), {})
+)
+
+
 class MultiOptions(dictobj.Spec):
     name = dictobj.Field(sb.string_spec, wrapper=sb.required)
     cache_amount = dictobj.NullableField(sb.integer_spec)
@@ -135,17 +162,25 @@ class Clone(dictobj.Spec):
     multi_options = dictobj.NullableField(MultiOptions.FieldSpec())
 
     def clone_struct(self, struct):
+        """
+        Return a copy of this struct that shares the fields the clone doesn't change
+
+        Fields with options are copied, as are reserved fields because they
+        are numbered from the reserved_start of the clone.
+        """
         clone = struct.clone()
         clone.multi_options = self.multi_options
 
         fields = []
         for field in struct.item_fields:
-            field = field.clone()
             options = self.fields.get(field.name)
             if options:
+                field = field.clone()
                 field.extras = field.extras + options.more_extras
                 if options.remove_default:
                     field.default = None
+            elif field.name is None:
+                field = field.clone()
             fields.append(field)
         clone.item_fields = fields
 
@@ -159,6 +194,11 @@ class IgnoreOptions(dictobj.Spec):
 class PacketOutputOptions(dictobj.Spec):
     include = dictobj.Field(sb.listof(sb.string_spec()))
     exclude = dictobj.Field(sb.listof(sb.string_spec()))
+    size_bytes = dictobj.Field(sb.boolean, default=False)
+
+
+class DispatchOutputOptions(dictobj.Spec):
+    array = dictobj.Field(sb.boolean, default=False)
 
 
 class output_spec(sb.Spec):
@@ -166,6 +206,10 @@ class output_spec(sb.Spec):
         val = Output.FieldSpec().normalise(meta, val)
         if val.create == "packets":
             val.options = PacketOutputOptions.FieldSpec().normalise(meta.at("options"), val.options)
+        elif val.create == "dispatch":
+            val.options = DispatchOutputOptions.FieldSpec().normalise(
+                meta.at("options"), val.options
+            )
         return val
 
 
@@ -178,24 +222,26 @@ class non_empty_list(sb.Spec):
 
 
 class Output(dictobj.Spec):
-    create = dictobj.Field(sb.string_choice_spec(["enums", "fields", "packets"]))
+    create = dictobj.Field(
+        sb.string_choice_spec(
+            ["enums", "fields", "packets", "layouts", "struct_formats", "dispatch"]
+        )
+    )
     options = dictobj.Field(sb.dictionary_spec)
     dest = dictobj.Field(non_empty_list(), wrapper=sb.required)
     static = dictobj.Field(sb.string_spec)
 
-    @contextmanager
-    def file(self, output_folder):
-        dest = os.path.join(output_folder, *self.dest)
-        directory = os.path.dirname(dest)
-        if not os.path.exists(directory):
-            os.makedirs(directory)
-
-        with open(dest, "w") as fle:
+    @property
+    def path(self):
+        return os.path.join(*self.dest)
 
-            def write_line(s):
-                print(s, file=fle)
+    @contextmanager
+    def render(self, rendered):
+        """Collect the lines for this output and put them in rendered[self.path]"""
+        lines = []
+        yield lines.append
 
-            yield write_line
+        rendered[self.path] = "\n".join(lines) + "\n" if lines else ""
 
 
 class Adjustments(dictobj.Spec):
@@ -209,6 +255,7 @@ class Adjustments(dictobj.Spec):
     ignore = dictobj.Field(sb.dictof(sb.string_spec(), IgnoreOptions.FieldSpec()))
     rename_namespaces = dictobj.Field(sb.dictof(sb.string_spec(), sb.string_spec()))
     invalid_field_names = dictobj.Field(sb.listof(sb.string_spec()))
+    strict_sizes = dictobj.Field(sb.boolean, default=False)
 
     def setup(self, *args, **kwargs):
         super().setup(*args, **kwargs)
@@ -240,6 +287,22 @@ class Adjustments(dictobj.Spec):
             parent.fields = u.fields
             parent.namespace = u.namespace
 
+    def compile_field_adjustments(self):
+        """
+        Return {(parent, field): FieldAdjustment} for every field in changes
+
+        This must be made after any ``change_using``
+        """
+        made = {}
+        compiled = {}
+        for parent, adjustment in self.changes.items():
+            for name, field in adjustment.fields.items():
+                # Packets with using share the fields of the packet they use
+                if id(field) not in made:
+                    made[id(field)] = FieldAdjustment(field)
+                compiled[(parent, name)] = made[id(field)]
+        return compiled
+
     def field_attr(self, parent, field, attr, when_missing=None):
         field = self.field(parent, field)
         if field:
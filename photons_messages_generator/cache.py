@@ -0,0 +1,84 @@
+from photons_messages_generator import VERSION
+
+import hashlib
+import logging
+import json
+import os
+
+log = logging.getLogger("generator.cache")
+
+
+def default_cache_dir():
+    root = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(root, "photons_messages_generator")
+
+
+def digest(content):
+    if isinstance(content, str):
+        content = content.encode()
+    return hashlib.sha256(content).hexdigest()
+
+
+class BuildCache:
+    """
+    Remembers what was last generated into an output folder.
+
+    The key is made from the src document, the adjustments document and the
+    version of this generator. If the key hasn't changed and the files we
+    generated last time are still there with the same content, then there is
+    nothing to do.
+    """
+
+    def __init__(self, cache_dir, output_folder):
+        self.output_folder = output_folder
+        name = digest(os.path.abspath(output_folder))
+        self.location = os.path.join(cache_dir, "builds", f"{name}.json")
+
+    @classmethod
+    def key_for(kls, src, adjustments):
+        h = hashlib.sha256()
+        for part in (VERSION, src, adjustments):
+            if isinstance(part, str):
+                part = part.encode()
+            h.update(str(len(part)).encode())
+            h.update(b":")
+            h.update(part)
+        return h.hexdigest()
+
+    def read(self):
+        if not os.path.exists(self.location):
+            return None
+
+        try:
+            with open(self.location) as fle:
+                return json.load(fle)
+        except (OSError, ValueError) as error:
+            log.warning(f"Ignoring unreadable build cache {self.location}: {error}")
+            return None
+
+    def is_fresh(self, key):
+        manifest = self.read()
+        if not manifest or manifest.get("key") != key:
+            return False
+
+        for path, want in manifest.get("files", {}).items():
+            location = os.path.join(self.output_folder, path)
+            if not os.path.exists(location):
+                return False
+            with open(location, "rb") as fle:
+                if digest(fle.read()) != want:
+                    return False
+
+        return True
+
+    def record(self, key, paths):
+        # Imported here so the executor can check the cache without importing helpers
+        from photons_messages_generator.helpers import write_atomically
+
+        files = {}
+        for path in paths:
+            with open(os.path.join(self.output_folder, path), "rb") as fle:
+                files[path] = digest(fle.read())
+
+        os.makedirs(os.path.dirname(self.location), exist_ok=True)
+        write_atomically(self.location, json.dumps({"key": key, "files": files}, sort_keys=True))
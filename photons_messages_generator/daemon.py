@@ -0,0 +1,164 @@
+"""
+A long running generator that takes requests over a unix socket.
+
+Each request is one line of json and gets one line of json back::
+
+    {"src": "/p/protocol.yml", "adjustments": "/p/adjustments.yml", "output_folder": "/p/out"}
+
+    {"ok": true, "files": {"enums.py": "written", "fields.py": "unchanged", ...}}
+    {"ok": false, "error": "...", "error_type": "NoSuchType"}
+
+The paths must be absolute because the daemon doesn't know where the client
+is. ``{"command": "shutdown"}`` stops the daemon once it has replied.
+
+Normalised src documents are kept in memory by the hash of the file, so many
+requests against the same protocol only parse and normalise it once. Every
+request resolves its own copy of that src.
+"""
+from photons_messages_generator.generate import normalise, resolve, render, write_rendered
+from photons_messages_generator.fast_src import copy_src
+from photons_messages_generator.watch import MemoryDocuments
+from photons_messages_generator.loader import load_yaml
+from photons_messages_generator.cache import digest
+
+from delfick_project.errors import DelfickError
+from collections import OrderedDict
+import socketserver
+import logging
+import socket
+import json
+import stat
+import os
+
+log = logging.getLogger("generator.daemon")
+
+
+class ResidentSources:
+    """The most recently used normalised src documents by the hash of their content"""
+
+    def __init__(self, documents=None, keep=4):
+        self.keep = keep
+        self.documents = documents
+        self.sources = OrderedDict()
+
+    def get(self, path):
+        """Return a copy of the normalised src in this file that is ours to resolve"""
+        with open(path) as fle:
+            content = fle.read()
+
+        key = digest(content)
+        if key not in self.sources:
+            self.sources[key] = normalise(load_yaml(content, cache=self.documents, name=path))
+            while len(self.sources) > self.keep:
+                self.sources.popitem(last=False)
+
+        self.sources.move_to_end(key)
+        return copy_src(self.sources[key])
+
+
+class Daemon:
+    def __init__(self, socket_path, documents=None, jobs=1, strict_duplicates=False):
+        self.jobs = jobs
+        self.strict_duplicates = strict_duplicates
+        self.socket_path = socket_path
+        self.stopping = False
+
+        self.documents = MemoryDocuments(fallback=documents)
+        self.sources = ResidentSources(documents=documents)
+
+    def respond(self, line):
+        """Return the response for one line of the protocol"""
+        try:
+            request = json.loads(line)
+            if not isinstance(request, dict):
+                raise ValueError("Expected a json object")
+
+            command = request.get("command", "generate")
+            if command == "shutdown":
+                self.stopping = True
+                return {"ok": True}
+            elif command == "generate":
+                paths = [request[name] for name in ("src", "adjustments", "output_folder")]
+                relative = [path for path in paths if not os.path.isabs(path)]
+                if relative:
+                    raise ValueError(f"Paths must be absolute: {', '.join(relative)}")
+                return {"ok": True, "files": self.generate(*paths)}
+            else:
+                raise ValueError(f"Unknown command {command}")
+
+        except DelfickError as error:
+            return {"ok": False, "error": str(error), "error_type": type(error).__name__}
+        except Exception as error:
+            log.exception("Failed to handle request")
+            return {"ok": False, "error": str(error), "error_type": type(error).__name__}
+
+    def generate(self, src_path, adjustments_path, output_folder):
+        src = self.sources.get(src_path)
+
+        with open(adjustments_path) as fle:
+            adjustments = load_yaml(fle.read(), cache=self.documents, name=adjustments_path)
+
+        src, adjustments = resolve(src, adjustments, strict_duplicates=self.strict_duplicates)
+        rendered = render(src, adjustments, jobs=self.jobs)
+        return write_rendered(rendered, output_folder)
+
+    def serve(self):
+        """Answer requests until we are asked to shutdown"""
+        daemon = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                for line in self.rfile:
+                    if not line.strip():
+                        continue
+
+                    response = daemon.respond(line)
+                    self.wfile.write(json.dumps(response).encode() + b"\n")
+                    self.wfile.flush()
+
+                    if daemon.stopping:
+                        return
+
+        remove_stale_socket(self.socket_path)
+        with socketserver.UnixStreamServer(self.socket_path, Handler) as server:
+            log.info(f"Listening on {self.socket_path}")
+            try:
+                while not self.stopping:
+                    server.handle_request()
+            finally:
+                os.remove(self.socket_path)
+
+
+def remove_stale_socket(path):
+    """Remove the socket at path unless a daemon is still listening on it"""
+    if os.path.exists(path):
+        if not stat.S_ISSOCK(os.stat(path).st_mode):
+            raise Exception(f"Refusing to replace {path} because it isn't a socket")
+
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            try:
+                sock.connect(path)
+            except (ConnectionRefusedError, FileNotFoundError):
+                pass
+            else:
+                raise Exception(f"Refusing to replace {path} because a daemon is listening on it")
+
+        os.remove(path)
+
+
+def request(socket_path, **kwargs):
+    """
+    Send one request to the daemon listening on socket_path and return the response
+
+    The paths we generate with are made absolute from where we are.
+    """
+    for name in ("src", "adjustments", "output_folder"):
+        if name in kwargs:
+            kwargs[name] = os.path.abspath(kwargs[name])
+
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.connect(socket_path)
+        with sock.makefile("rwb") as stream:
+            stream.write(json.dumps(kwargs).encode() + b"\n")
+            stream.flush()
+            return json.loads(stream.readline())
@@ -91,3 +91,11 @@ class BadSizeBytes(GeneratorError):
 
 class MissingUnionOptions(GeneratorError):
     desc = "Union fields need some extra options"
+
+
+class WrongSizeBytes(GeneratorError):
+    desc = "size_bytes doesn't match the fields"
+
+
+class BadIR(GeneratorError):
+    desc = "couldn't read the ir"
@@ -1,14 +1,22 @@
-from photons_messages_generator.generate import generate
+"""
+The generate_photons_messages script.
+
+Only argparse and the build cache are imported when this module is loaded.
+Everything else is imported where it's needed, so that ``--help`` and
+finding that nothing changed don't wait for the yaml parser, the norms
+library and the resolver to import.
+"""
+from photons_messages_generator.cache import default_cache_dir
 
-from delfick_project.logging import setup_logging
-from delfick_project.errors import DelfickError
-from ruamel.yaml import YAML
 import argparse
+import logging
 import sys
 import os
 
 this_dir = os.path.dirname(__file__)
 
+log = logging.getLogger("generator.executor")
+
 
 def make_parser():
     parser = argparse.ArgumentParser(description="messages generator")
@@ -24,31 +32,255 @@ def make_parser():
     add_argument("src")
     add_argument("adjustments", type=argparse.FileType("r"))
     add_argument("output_folder")
+    add_argument("cache_dir", default=default_cache_dir())
+    add_argument("jobs", type=int, default=1, help="How many outputs to render at the same time")
+    add_argument(
+        "profile",
+        help="Write per phase timings, counts and peak memory as json to this file or - for the log",
+    )
+    add_argument("profile_resolve", help="Dump cProfile stats for the resolve stage to this file")
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        default=os.environ.get("NO_CACHE") == "1",
+        help="Always generate and don't read or write any caches",
+    )
+    parser.add_argument(
+        "--watch",
+        action="store_true",
+        default=os.environ.get("WATCH") == "1",
+        help="Keep running and generate again whenever the src or adjustments change",
+    )
+    parser.add_argument(
+        "--strict-duplicates",
+        action="store_true",
+        default=os.environ.get("STRICT_DUPLICATES") == "1",
+        help="Warn about packets that start with the same fields but resolve differently",
+    )
+    parser.add_argument(
+        "--stream",
+        action="store_true",
+        default=os.environ.get("STREAM") == "1",
+        help="Normalise the src as it is parsed rather than loading all of it first",
+    )
+    add_argument("dump_ir", help="Also write the resolved src as binary ir to this file")
+    add_argument(
+        "variants",
+        help="Generate every yml file in this folder as adjustments into a folder of its own",
+    )
+    add_argument(
+        "daemon",
+        help="Answer generate requests on this unix socket instead of generating once",
+    )
+    add_argument(
+        "watch_debounce",
+        type=float,
+        default=0.2,
+        help="Wait until the files haven't changed for this many seconds before generating",
+    )
 
     return parser
 
 
 def main(argv=None):
-    setup_logging()
-
     parser = make_parser()
     args = parser.parse_args(argv)
 
+    from delfick_project.logging import setup_logging
+
+    setup_logging()
+
+    if args.daemon:
+        from photons_messages_generator.loader import DocumentCache
+        from photons_messages_generator.daemon import Daemon
+
+        documents = None if args.no_cache else DocumentCache(args.cache_dir)
+        Daemon(
+            args.daemon,
+            documents=documents,
+            jobs=args.jobs,
+            strict_duplicates=args.strict_duplicates,
+        ).serve()
+        return
+
     if not os.path.exists(args.src):
         raise Exception(
             "Couldn't find the source yaml file, did you `git submodule update --init` ?"
         )
 
+    documents = None
+    if not args.no_cache:
+        from photons_messages_generator.loader import DocumentCache
+
+        documents = DocumentCache(args.cache_dir)
+
+    if args.variants:
+        variants(args, documents)
+        return
+
+    if args.watch:
+        watch(args, documents)
+        return
+
     with open(args.src) as fle:
-        src = YAML(typ="safe").load(fle)
-    adjustments = YAML(typ="safe").load(args.adjustments)
+        src_content = fle.read()
+    adjustments_content = args.adjustments.read()
 
-    if not os.path.exists(args.output_folder):
-        os.makedirs(args.output_folder)
+    from delfick_project.errors import DelfickError
 
     try:
-        generate(src, adjustments, args.output_folder)
+        generate_once(args, src_content, adjustments_content, documents)
     except DelfickError as error:
         print("")
         print("!" * 20)
         sys.exit(str(error))
+
+
+def generate_once(args, src_content, adjustments_content, documents):
+    """Generate from this content unless the build cache says nothing changed"""
+    from photons_messages_generator.cache import BuildCache
+
+    cache = key = None
+    if not args.no_cache:
+        cache = BuildCache(args.cache_dir, args.output_folder)
+        key = BuildCache.key_for(src_content, adjustments_content)
+        if cache_can_skip(args) and cache.is_fresh(key):
+            log.info("Nothing changed since the last generate")
+            return
+
+    from photons_messages_generator.profiling import Profile, no_profile
+    from photons_messages_generator.generate import generate
+    from photons_messages_generator.loader import load_yaml
+
+    profile = no_profile
+    if args.profile or args.profile_resolve:
+        profile = Profile(cprofile_path=args.profile_resolve)
+
+    with profile.phase("load.src"):
+        src = load_src(args, src_content, documents)
+    with profile.phase("load.adjustments"):
+        adjustments = load_yaml(adjustments_content, cache=documents, name=args.adjustments.name)
+
+    if not os.path.exists(args.output_folder):
+        os.makedirs(args.output_folder)
+
+    written = generate(
+        src,
+        adjustments,
+        args.output_folder,
+        jobs=args.jobs,
+        profile=profile,
+        strict_duplicates=args.strict_duplicates,
+        ir_path=args.dump_ir,
+    )
+
+    if cache is not None and written is not None:
+        cache.record(key, written)
+
+    if args.profile:
+        profile.dump(args.profile)
+
+
+def cache_can_skip(args):
+    """
+    Whether a fresh build cache means there is nothing to do
+
+    The cache only knows about the files we write, so options that ask for
+    more than those files need us to generate anyway.
+    """
+    # The warnings about duplicates are only made when we resolve
+    if args.strict_duplicates:
+        return False
+
+    # There is nothing to profile if we don't generate
+    if args.profile or args.profile_resolve:
+        return False
+
+    # The ir isn't in the cache and may be from an older to_ir or IR_FORMAT
+    if args.dump_ir:
+        return False
+
+    return True
+
+
+def load_src(args, content, documents):
+    """Return the parsed src, or the normalised src if we are streaming it"""
+    if args.stream:
+        from photons_messages_generator.stream import stream_src
+
+        return stream_src(content, cache=documents, name=args.src)
+
+    from photons_messages_generator.loader import load_yaml
+
+    return load_yaml(content, cache=documents, name=args.src)
+
+
+def variants(args, documents):
+    """Generate each adjustments file in args.variants into output_folder/<name of the file>"""
+    from photons_messages_generator.generate import generate_variants
+    from photons_messages_generator.loader import load_yaml
+
+    filenames = sorted(
+        filename for filename in os.listdir(args.variants) if filename.endswith((".yml", ".yaml"))
+    )
+    if not filenames:
+        raise Exception(f"Found no yml files in {args.variants}")
+
+    with open(args.src) as fle:
+        src = load_src(args, fle.read(), documents)
+
+    loaded = {}
+    for filename in filenames:
+        location = os.path.join(args.variants, filename)
+        with open(location) as fle:
+            loaded[os.path.splitext(filename)[0]] = load_yaml(
+                fle.read(), cache=documents, name=location
+            )
+
+    results = generate_variants(
+        src, loaded, args.output_folder, jobs=args.jobs, strict_duplicates=args.strict_duplicates
+    )
+
+    failed = [name for name, result in results.items() if "error" in result]
+    if failed:
+        print("")
+        print("!" * 20)
+        sys.exit(f"Failed to generate {', '.join(failed)}")
+
+
+def watch(args, documents):
+    """
+    Generate now and again every time the src or adjustments files change
+
+    Parsed documents are kept in memory between generates, so only a file
+    that changed is parsed again. Errors are logged and we keep watching.
+    """
+    from photons_messages_generator.watch import MemoryDocuments, make_watcher
+    from delfick_project.errors import DelfickError
+
+    if args.adjustments is sys.stdin:
+        raise Exception("Can't watch adjustments that come from stdin")
+    args.adjustments.close()
+
+    documents = MemoryDocuments(fallback=documents)
+    watcher = make_watcher([args.src, args.adjustments.name])
+
+    try:
+        while True:
+            try:
+                with open(args.src) as fle:
+                    src_content = fle.read()
+                with open(args.adjustments.name) as fle:
+                    adjustments_content = fle.read()
+                generate_once(args, src_content, adjustments_content, documents)
+            except DelfickError as error:
+                log.error(f"Failed to generate\n{error}")
+            except Exception:
+                log.exception("Failed to generate")
+
+            log.info("Waiting for changes")
+            watcher.wait(args.watch_debounce)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        watcher.close()
@@ -0,0 +1,279 @@
+"""
+A fast path for normalising the src document.
+
+Normalising with ``Src.FieldSpec()`` creates every value through the norms
+machinery, tracking a ``Meta`` path for each value. That gives great error
+messages but is slow for big documents. Here we instead check the document
+with plain python and create light objects with ``__slots__``.
+
+We only understand the shape the src document normally has. If anything is
+different, including anything invalid, we give up and use ``Src.FieldSpec()``
+on the whole document. That either normalises the unusual value or raises
+exactly the error it always has.
+"""
+from photons_messages_generator.helpers import valid_enum_types
+from photons_messages_generator.src import Src, StructBehaviour, StructFieldBehaviour
+
+from delfick_project.norms import Meta, sb
+
+
+class Unexpected(Exception):
+    """Raised when the fast path doesn't understand the document"""
+
+
+class Slotted:
+    """Base for objects that behave like the dictobj objects they replace"""
+
+    __slots__ = ()
+
+    # The attributes that are copied by clone and shown in the repr
+    fields = ()
+
+    def clone(self):
+        clone = object.__new__(self.__class__)
+        for name in self.fields:
+            setattr(clone, name, getattr(self, name))
+        return clone
+
+    def __repr__(self):
+        return repr({name: getattr(self, name) for name in sorted(self.fields)})
+
+
+class EnumValue(Slotted):
+    __slots__ = fields = ("name", "value")
+
+    def __init__(self, name, value):
+        self.name = name
+        self.value = value
+
+
+class Enum(Slotted):
+    __slots__ = fields = ("name", "full_name", "type", "values")
+
+    def __init__(self, name, full_name, type, values):
+        self.name = name
+        self.full_name = full_name
+        self.type = type
+        self.values = values
+
+
+class StructField(StructFieldBehaviour, Slotted):
+    fields = (
+        "name",
+        "full_name",
+        "type",
+        "original_type",
+        "size_bits",
+        "size_bytes",
+        "default",
+        "extras",
+    )
+    __slots__ = fields + ("union_enum", "union_switch_field")
+
+    def __init__(
+        self, name, full_name, type, original_type, size_bits, size_bytes, default, extras
+    ):
+        self.name = name
+        self.full_name = full_name
+        self.type = type
+        self.original_type = original_type
+        self.size_bits = size_bits
+        self.size_bytes = size_bytes
+        self.default = default
+        self.extras = extras
+
+
+class Struct(StructBehaviour, Slotted):
+    fields = ("name", "full_name", "size_bytes", "item_fields", "multi_options")
+    __slots__ = fields + ("union_enum",)
+
+    def __init__(self, name, full_name, size_bytes, item_fields, multi_options):
+        self.name = name
+        self.full_name = full_name
+        self.size_bytes = size_bytes
+        self.item_fields = item_fields
+        self.multi_options = multi_options
+
+
+class Packet(Slotted):
+    __slots__ = fields = ("name", "full_name", "namespace", "pkt_type", "size_bytes", "item_fields")
+
+    def __init__(self, name, full_name, namespace, pkt_type, size_bytes, item_fields):
+        self.name = name
+        self.full_name = full_name
+        self.namespace = namespace
+        self.pkt_type = pkt_type
+        self.size_bytes = size_bytes
+        self.item_fields = item_fields
+
+
+class FastSrc(Slotted):
+    __slots__ = fields = ("enums", "unions", "groups", "packets")
+
+    def __init__(self, enums, unions, groups, packets):
+        self.enums = enums
+        self.unions = unions
+        self.groups = groups
+        self.packets = packets
+
+
+def expect(condition):
+    if not condition:
+        raise Unexpected()
+
+
+def is_int(val):
+    return type(val) is int
+
+
+def is_nullable_str(val):
+    return val is None or type(val) is str
+
+
+def mapping(val, key):
+    """Return the dictionary at key or an empty one if it isn't there"""
+    if key not in val:
+        return {}
+    found = val[key]
+    expect(type(found) is dict)
+    return found
+
+
+def make_enum(name, val):
+    expect(type(name) is str and type(val) is dict)
+
+    typ = val.get("type")
+    expect(type(typ) is str and typ in valid_enum_types)
+
+    found = val.get("values", [])
+    expect(type(found) is list)
+
+    values = []
+    for value in found:
+        expect(type(value) is dict)
+        n = value.get("name")
+        v = value.get("value")
+        expect(type(n) is str and is_int(v))
+        values.append(EnumValue(n, v))
+
+    return Enum(name, name, typ, values)
+
+
+def make_field(val):
+    expect(type(val) is dict)
+
+    typ = val.get("type")
+    expect(type(typ) is str)
+
+    if typ == "reserved":
+        expect("name" not in val)
+        name = None
+        full_name = val.get("full_name")
+    else:
+        expect("name" in val)
+        name = full_name = val["name"]
+    expect(is_nullable_str(name) and is_nullable_str(full_name))
+
+    size_bits = val.get("size_bits", sb.NotSpecified)
+    size_bytes = val.get("size_bytes", sb.NotSpecified)
+    if size_bits is sb.NotSpecified:
+        expect(is_int(size_bytes))
+        size_bits = size_bytes * 8
+    else:
+        expect(is_int(size_bits) and size_bytes is sb.NotSpecified)
+
+    default = val.get("default")
+    expect(is_nullable_str(default))
+
+    extras = val.get("extras", [])
+    expect(type(extras) is list and all(type(e) is str for e in extras))
+
+    return StructField(name, full_name, typ, typ, size_bits, size_bytes, default, list(extras))
+
+
+def make_fields(val, required):
+    if val is sb.NotSpecified:
+        expect(not required)
+        return []
+    expect(type(val) is list)
+    return [make_field(v) for v in val]
+
+
+def make_struct(name, val):
+    expect(type(name) is str and type(val) is dict)
+
+    size_bytes = val.get("size_bytes")
+    expect(is_int(size_bytes))
+
+    item_fields = val["fields"] if "fields" in val else val.get("item_fields", sb.NotSpecified)
+    return Struct(name, name, size_bytes, make_fields(item_fields, False), val.get("multi_options"))
+
+
+def make_packet(namespace, name, val):
+    expect(type(namespace) is str and type(name) is str and type(val) is dict)
+
+    pkt_type = val.get("pkt_type")
+    size_bytes = val.get("size_bytes")
+    expect(is_int(pkt_type) and is_int(size_bytes))
+
+    item_fields = val["fields"] if "fields" in val else val.get("item_fields", sb.NotSpecified)
+    return Packet(name, name, namespace, pkt_type, size_bytes, make_fields(item_fields, True))
+
+
+def fast_normalise(val):
+    """Normalise the src document or raise Unexpected if we can't"""
+    expect(type(val) is dict)
+
+    enums = [make_enum(name, v) for name, v in mapping(val, "enums").items()]
+    unions = [make_struct(name, v) for name, v in mapping(val, "unions").items()]
+    groups = [make_struct(name, v) for name, v in mapping(val, "groups").items()]
+
+    packets = []
+    for namespace, found in mapping(val, "packets").items():
+        expect(type(found) is dict)
+        for name, v in found.items():
+            packets.append(make_packet(namespace, name, v))
+
+    return FastSrc(enums, unions, groups, packets)
+
+
+def normalise_src(val):
+    """
+    Normalise the src document
+
+    This uses the fast path and falls back to ``Src.FieldSpec()`` when the
+    fast path doesn't understand the document.
+    """
+    try:
+        return fast_normalise(val)
+    except Unexpected:
+        return Src.FieldSpec().normalise(Meta({}, []).at("src"), val)
+
+
+def copy_src(src):
+    """
+    Return a copy of a normalised src that can be resolved without changing src
+
+    Only the objects that resolving changes are copied. Everything else, like
+    strings and the lists of extras, is shared because resolving replaces
+    those rather than changing them.
+
+    This works for what either fast_normalise or ``Src.FieldSpec()`` made.
+    """
+
+    def copy_enum(enum):
+        clone = enum.clone()
+        clone.values = [value.clone() for value in enum.values]
+        return clone
+
+    def copy_struct(struct):
+        clone = struct.clone()
+        clone.item_fields = [field.clone() for field in struct.item_fields]
+        return clone
+
+    return FastSrc(
+        [copy_enum(enum) for enum in src.enums],
+        [copy_struct(union) for union in src.unions],
+        [copy_struct(struct) for struct in src.groups],
+        [copy_struct(packet) for packet in src.packets],
+    )
@@ -1,8 +1,47 @@
 from photons_messages_generator.helpers import convert_type
 from photons_messages_generator import errors
 
+from functools import lru_cache
+
+
+# What a type formats to only depends on these values, and many fields share
+# them, so we remember them rather than making the same strings for every field
+
+
+@lru_cache(maxsize=4096)
+def simple_format(val, multiples, size_bits):
+    multiple = ""
+    if multiples > 1:
+        multiple = f".multiple({multiples})"
+
+    if size_bits % multiples != 0:
+        raise errors.BadSizeBytes(
+            "Expected size bytes to be divisible by multiple",
+            multiple=multiples,
+            size_bits=size_bits,
+        )
+
+    if val == "byte":
+        multiple = ""
+    else:
+        size_bits = int(size_bits / multiples)
+    return f"{convert_type(val, size_bits)}{multiple}"
+
+
+@lru_cache(maxsize=4096)
+def enum_format(enum_type, enum_name, allow_unknown, multiples, size_bits):
+    options = ""
+    multiple = ""
+    if allow_unknown:
+        options = ", allow_unknown=True"
+    if multiples > 1:
+        multiple = f".multiple({multiples})"
+    return f"{convert_type(enum_type, size_bits)}.enum(enums.{enum_name}{options}){multiple}"
+
 
 class SimpleType:
+    __slots__ = ("val", "multiples")
+
     def __init__(self, val, multiples):
         self.val = val
         self.multiples = multiples
@@ -11,25 +50,12 @@ class SimpleType:
         return f"<Simple: {self.multiples}: {self.val}>"
 
     def format(self, size_bits, **kwargs):
-        multiples = ""
-        if self.multiples > 1:
-            multiples = f".multiple({self.multiples})"
-
-        if size_bits % self.multiples != 0:
-            raise errors.BadSizeBytes(
-                "Expected size bytes to be divisible by multiple",
-                multiple=self.multiples,
-                size_bits=size_bits,
-            )
-
-        if self.val == "byte":
-            multiples = ""
-        else:
-            size_bits = int(size_bits / self.multiples)
-        return f"{convert_type(self.val, size_bits)}{multiples}"
+        return simple_format(self.val, self.multiples, size_bits)
 
 
 class StringType:
+    __slots__ = ()
+
     def __repr__(self):
         return "<String>"
 
@@ -38,14 +64,21 @@ class StringType:
 
 
 class EnumType:
+    __slots__ = ("enum", "allow_unknown", "multiples", "names")
+
     def __init__(self, enum, multiples, allow_unknown=False):
         self.enum = enum
         self.allow_unknown = allow_unknown
         self.multiples = multiples
+        self.names = None
 
     def value(self, name):
-        names = [v.name for v in self.enum.values]
-        if name not in names:
+        # Values are renamed while resolving, so we only find the names once they're used
+        if self.names is None:
+            self.names = frozenset(v.name for v in self.enum.values)
+
+        if name not in self.names:
+            names = [v.name for v in self.enum.values]
             raise errors.NoSuchEnumValue(wanted=name, available=names, enum=self.enum.name)
         return name
 
@@ -53,16 +86,13 @@ class EnumType:
         return f"<Enum: {self.enum.type}: {self.enum.name}>"
 
     def format(self, size_bits, **kwargs):
-        options = ""
-        multiple = ""
-        if self.allow_unknown:
-            options = ", allow_unknown=True"
-        if self.multiples > 1:
-            multiple = f".multiple({self.multiples})"
-        return f"{convert_type(self.enum.type, size_bits)}.enum(enums.{self.enum.name}{options}){multiple}"
+        enum = self.enum
+        return enum_format(enum.type, enum.name, self.allow_unknown, self.multiples, size_bits)
 
 
 class StructOverrideType:
+    __slots__ = ("struct",)
+
     def __init__(self, struct):
         self.struct = struct
 
@@ -74,6 +104,8 @@ class StructOverrideType:
 
 
 class SpecialType:
+    __slots__ = ("options",)
+
     def __init__(self, options):
         self.options = options
 
@@ -94,6 +126,8 @@ class SpecialType:
 
 
 class StructType:
+    __slots__ = ("struct", "multiples", "ignored", "expanded")
+
     def __init__(self, struct, multiples, expanded=False, ignored=False):
         self.struct = struct
         self.multiples = multiples
@@ -143,6 +177,8 @@ class StructType:
 
 
 class PacketType:
+    __slots__ = ("packet", "expanded")
+
     def __init__(self, packet, multiples):
         self.packet = packet
         self.expanded = True
@@ -182,6 +218,8 @@ class PacketType:
 
 
 class UnionType:
+    __slots__ = ("union", "switch_field", "expanded")
+
     def __init__(self, union, multiples, *, switch_field):
         self.union = union
         self.switch_field = switch_field
@@ -199,6 +237,8 @@ class UnionType:
 
 
 class OverrideType:
+    __slots__ = ("override",)
+
     def __init__(self, override):
         self.override = override
 
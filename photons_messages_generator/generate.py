@@ -1,21 +1,38 @@
-from photons_messages_generator.helpers import snake_to_camel, camel_to_snake
+from photons_messages_generator.helpers import snake_to_camel, camel_to_snake, write_if_changed
+from photons_messages_generator.layouts import (
+    namespaced_packets,
+    packet_layouts,
+    struct_layouts,
+    struct_format,
+)
 from photons_messages_generator.adjustments import Adjustments
+from photons_messages_generator.fast_src import FastSrc, copy_src, normalise_src
+from photons_messages_generator.parallel import run_in_order
+from photons_messages_generator.ir import dump_ir
+from photons_messages_generator.profiling import no_profile
 from photons_messages_generator.resolver import Resolver
 from photons_messages_generator.src import Src
 from photons_messages_generator import errors
 
+from delfick_project.errors import DelfickError
 from delfick_project.norms import Meta
 from collections import defaultdict
+import cProfile
 import fnmatch
 import logging
 import json
+import time
 import os
 
 log = logging.getLogger("generator.generate")
 
+# Forking workers and sending their output back costs more than rendering a
+# few outputs, so render only uses jobs when there are at least this many
+min_outputs_for_jobs = 8
 
-def write_enums(options, src, adjustments, output_folder):
-    with options.file(output_folder) as write_line:
+
+def write_enums(options, src, adjustments, rendered):
+    with options.render(rendered) as write_line:
         if options.static:
             write_line(options.static.strip())
             write_line("")
@@ -29,8 +46,8 @@ def write_enums(options, src, adjustments, output_folder):
                 write_line("")
 
 
-def write_fields(options, src, adjustments, output_folder):
-    with options.file(output_folder) as write_line:
+def write_fields(options, src, adjustments, rendered):
+    with options.render(rendered) as write_line:
         want = []
         for i, struct in enumerate(src.groups):
             if struct.full_name not in adjustments.ignore:
@@ -44,7 +61,8 @@ def write_fields(options, src, adjustments, output_folder):
             write_line("# fmt: off")
             write_line("")
 
-        for union in set(adjustments._used_unions):
+        # Keep the order unions were found in so the output is the same every time
+        for union in dict.fromkeys(adjustments._used_unions):
             write_line("")
             write_line(f"def {union.dynamic_function_name}(typ):")
             for i, field in enumerate(union.item_fields):
@@ -145,7 +163,8 @@ def write_messages_class(write_line, namespace, packets, src, adjustments):
     return klsname
 
 
-def write_packets(options_list, src, adjustments, output_folder):
+def packet_namespaces(options_list, src, adjustments):
+    """Return the packets for each namespace and the namespaces for each packets output"""
     by_namespace = defaultdict(list)
     for packet in src.packets:
         by_namespace[packet.namespace].append(packet)
@@ -182,39 +201,235 @@ def write_packets(options_list, src, adjustments, output_folder):
             )
         found.extend(namespaces)
 
-    for options in options_list:
-        with options.file(output_folder) as write_line:
-            if options.static:
-                write_line(options.static.strip())
-                write_line("")
+    return by_namespace, by_output
 
-            klses = []
 
-            write_line("# fmt: off")
+def write_size_bytes(write_line, sizes):
+    write_line("size_bytes = {")
+    for klsname, packets in sizes:
+        write_line(f"    {json.dumps(klsname)}: {{")
+        for packet in packets:
+            write_line(f"        {json.dumps(packet.name)}: {packet.size_bytes},")
+        write_line("    },")
+    write_line("}")
+    write_line("")
+
+
+def write_packets(options, src, adjustments, rendered, *, by_namespace, by_output):
+    with options.render(rendered) as write_line:
+        if options.static:
+            write_line(options.static.strip())
             write_line("")
 
-            for namespace in by_output[tuple(options.dest)]:
-                packets = sorted(by_namespace[namespace], key=lambda pkt: pkt.pkt_type)
-                klses.append(write_messages_class(write_line, namespace, packets, src, adjustments))
+        klses = []
+        sizes = []
 
-            write_line("# fmt: on")
+        write_line("# fmt: off")
+        write_line("")
+
+        for namespace in by_output[tuple(options.dest)]:
+            packets = sorted(by_namespace[namespace], key=lambda pkt: pkt.pkt_type)
+            klses.append(write_messages_class(write_line, namespace, packets, src, adjustments))
+            sizes.append((klses[-1], packets))
+
+        if options.options.size_bytes:
+            write_size_bytes(write_line, sizes)
+
+        write_line("# fmt: on")
+        write_line("")
+
+        write_line(f"__all__ = {json.dumps(klses)}")
+
+
+def write_layout(write_line, indent, name, size_bytes, layout):
+    if not layout:
+        write_line(f"{indent}{json.dumps(name)}: ({size_bytes}, ()),")
+        return
+
+    write_line(f"{indent}{json.dumps(name)}: ({size_bytes}, (")
+    for field_name, offset, width in layout:
+        write_line(f"{indent}    ({json.dumps(field_name)}, {offset}, {width}),")
+    write_line(f"{indent}  )),")
+
+
+def write_layouts(options, src, adjustments, rendered, *, by_namespace, by_output):
+    with options.render(rendered) as write_line:
+        if options.static:
+            write_line(options.static.strip())
             write_line("")
 
-            write_line(f"__all__ = {json.dumps(klses)}")
+        write_line("# fmt: off")
+        write_line("")
+
+        write_line("structs = {")
+        for name, size_bytes, layout in struct_layouts(src, adjustments):
+            write_layout(write_line, "    ", name, size_bytes, layout)
+        write_line("}")
+        write_line("")
+
+        write_line("messages = {")
+        for klsname, packets in packet_layouts(by_namespace, by_output):
+            write_line(f"    {json.dumps(klsname)}: {{")
+            for name, size_bytes, layout in packets:
+                write_layout(write_line, "        ", name, size_bytes, layout)
+            write_line("    },")
+        write_line("}")
+        write_line("")
+
+        write_line("# fmt: on")
+
 
+def write_struct_formats(options, src, adjustments, rendered, *, by_namespace, by_output):
+    formats = []
+    unsupported = []
+    for klsname, packets in namespaced_packets(by_namespace, by_output):
+        good, bad = [], []
+        for packet in packets:
+            fmt, reason = struct_format(packet.item_fields, packet.size_bytes)
+            if reason is None:
+                good.append(f"{json.dumps(packet.name)}: struct.Struct({json.dumps(fmt)}),")
+            else:
+                bad.append(f"{json.dumps(packet.name)}: {json.dumps(reason)},")
+        formats.append((klsname, good))
+        unsupported.append((klsname, bad))
 
-def generate(src, adjustments, output_folder):
+    with options.render(rendered) as write_line:
+        if options.static:
+            write_line(options.static.strip())
+            write_line("")
+
+        write_line("import struct")
+        write_line("")
+        write_line("# fmt: off")
+        write_line("")
+
+        for name, found in (("formats", formats), ("unsupported", unsupported)):
+            write_line(f"{name} = {{")
+            for klsname, lines in found:
+                if lines:
+                    write_line(f"    {json.dumps(klsname)}: {{")
+                    for line in lines:
+                        write_line(f"        {line}")
+                    write_line("    },")
+            write_line("}")
+            write_line("")
+
+        write_line("# fmt: on")
+
+
+def write_dispatch(options, src, adjustments, rendered, *, by_namespace, by_output):
+    by_pkt_type = {}
+    for klsname, packets in namespaced_packets(by_namespace, by_output):
+        for packet in packets:
+            if packet.pkt_type in by_pkt_type:
+                raise errors.InvalidOutput(
+                    "Can't make a dispatch table with duplicate pkt_types",
+                    pkt_type=packet.pkt_type,
+                    first=by_pkt_type[packet.pkt_type][:2],
+                    second=(klsname, packet.name),
+                )
+            by_pkt_type[packet.pkt_type] = (klsname, packet.name, packet.size_bytes)
+
+    def entry(pkt_type):
+        klsname, name, size_bytes = by_pkt_type[pkt_type]
+        return f"({json.dumps(klsname)}, {json.dumps(name)}, {size_bytes})"
+
+    with options.render(rendered) as write_line:
+        if options.static:
+            write_line(options.static.strip())
+            write_line("")
+
+        write_line("# fmt: off")
+        write_line("")
+
+        write_line("by_pkt_type = {")
+        for pkt_type in sorted(by_pkt_type):
+            write_line(f"    {pkt_type}: {entry(pkt_type)},")
+        write_line("}")
+        write_line("")
+
+        if options.options.array:
+            write_line("by_index = [")
+            for pkt_type in range(max(by_pkt_type, default=-1) + 1):
+                found = entry(pkt_type) if pkt_type in by_pkt_type else "None"
+                write_line(f"    {found},")
+            write_line("]")
+            write_line("")
+
+        write_line("# fmt: on")
+
+
+def normalise(src):
+    """Normalise the parsed src document into the objects the resolver changes"""
     if "fields" in src:
         src["groups"] = src["fields"]
-    src = Src.FieldSpec().normalise(Meta({}, []).at("src"), src)
+    return normalise_src(src)
 
-    adjustments = Adjustments.FieldSpec().normalise(Meta({}, []).at("adjustment"), adjustments)
 
-    Resolver(src, adjustments).resolve()
+def resolve(src, adjustments, profile=no_profile, strict_duplicates=False):
+    """
+    Normalise the src and adjustments and resolve them into what we render
 
-    if os.environ.get("NO_OUTPUT") == "1":
-        return
+    The src may be the parsed document or one that was already normalised.
+    Resolving changes a normalised src in place.
+
+    With strict_duplicates we warn about packets that start with the same
+    fields but resolve differently.
+    """
+    with profile.phase("normalise.src"):
+        if not isinstance(src, (FastSrc, Src)):
+            src = normalise(src)
+
+    with profile.phase("normalise.adjustments"):
+        adjustments = Adjustments.FieldSpec().normalise(Meta({}, []).at("adjustment"), adjustments)
+
+    if profile.enabled:
+        profile.count("enums", len(src.enums))
+        profile.count("structs", len(src.groups))
+        profile.count("unions", len(src.unions))
+        profile.count("packets", len(src.packets))
+        profile.count("fields", sum(len(s.item_fields) for s in src.groups))
+        profile.count("fields", sum(len(p.item_fields) for p in src.packets))
+
+    with profile.phase("resolve"):
+        resolver = Resolver(src, adjustments, profile=profile, strict_duplicates=strict_duplicates)
+        if profile.cprofile_path:
+            stats = cProfile.Profile()
+            stats.runcall(resolver.resolve)
+            stats.dump_stats(profile.cprofile_path)
+        else:
+            resolver.resolve()
+
+    if profile.enabled:
+        profile.count("resolved_fields", sum(len(s.item_fields) for s in src.groups))
+        profile.count("resolved_fields", sum(len(p.item_fields) for p in src.packets))
 
+    return src, adjustments
+
+
+def render_output(shared, writer, options, namespaced):
+    """
+    Return ``(path, seconds, rendered)`` for one output
+
+    This may be in a worker, so it's timed here and recorded by render.
+    """
+    src, adjustments, by_namespace, by_output = shared
+    kwargs = {"by_namespace": by_namespace, "by_output": by_output} if namespaced else {}
+
+    rendered = {}
+    start = time.perf_counter()
+    writer(options, src, adjustments, rendered, **kwargs)
+    return options.path, time.perf_counter() - start, rendered
+
+
+def render(src, adjustments, jobs=1, profile=no_profile):
+    """
+    Return ``{path: content}`` for every output of the resolved src and adjustments
+
+    Each output is rendered independently and may be done in parallel by
+    passing more than one job when there are at least min_outputs_for_jobs
+    outputs.
+    """
     by_type = defaultdict(list)
     for options in adjustments.output:
         by_type[options.create].append(options)
@@ -224,11 +439,135 @@ def generate(src, adjustments, output_folder):
             raise errors.InvalidOutput(f"Must specify {t} output only once", found=len(by_type[t]))
         by_type[t] = by_type[t][0]
 
-    log.info("Writing enums")
-    write_enums(by_type["enums"], src, adjustments, output_folder)
+    by_namespace, by_output = packet_namespaces(by_type["packets"], src, adjustments)
+
+    # (writer, options, whether the writer needs the namespaces of the packets outputs)
+    tasks = [(write_enums, by_type["enums"], False), (write_fields, by_type["fields"], False)]
+    namespaced = (
+        ("packets", write_packets),
+        ("layouts", write_layouts),
+        ("struct_formats", write_struct_formats),
+        ("dispatch", write_dispatch),
+    )
+    for create, writer in namespaced:
+        for options in by_type[create]:
+            tasks.append((writer, options, True))
+
+    log.info(f"Rendering enums, fields and {len(by_type['packets'])} packets outputs")
+    if len(tasks) < min_outputs_for_jobs:
+        jobs = 1
+
+    shared = (src, adjustments, by_namespace, by_output)
+
+    rendered = {}
+    with profile.phase("render"):
+        for path, seconds, result in run_in_order(render_output, tasks, jobs=jobs, shared=shared):
+            profile.record(f"render.{path}", seconds)
+            rendered.update(result)
+    profile.count("outputs", len(tasks))
+
+    return {options.path: rendered[options.path] for options in adjustments.output}
+
+
+def generate_to_memory(src, adjustments, jobs=1, profile=no_profile, strict_duplicates=False):
+    """
+    Return ``{path: content}`` for the files generate would write
+
+    The paths are relative to where the output would be written.
+    """
+    src, adjustments = resolve(
+        src, adjustments, profile=profile, strict_duplicates=strict_duplicates
+    )
+    return render(src, adjustments, jobs=jobs, profile=profile)
+
+
+def write_rendered(rendered, output_folder):
+    """
+    Write the result of render to output_folder, leaving unchanged files alone
+
+    Return ``{path: "written" or "unchanged"}``
+    """
+    result = {}
+    for path, content in rendered.items():
+        dest = os.path.join(output_folder, path)
+        directory = os.path.dirname(dest)
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+
+        if write_if_changed(dest, content):
+            result[path] = "written"
+        else:
+            result[path] = "unchanged"
+        log.info(f"{result[path]}: {path}")
+
+    written = sum(1 for state in result.values() if state == "written")
+    log.info(f"Wrote {written} files and left {len(rendered) - written} unchanged")
+    return result
+
+
+def generate(
+    src,
+    adjustments,
+    output_folder,
+    jobs=1,
+    profile=no_profile,
+    strict_duplicates=False,
+    ir_path=None,
+):
+    """
+    Normalise and resolve the src and adjustments and write out the files.
+
+    If ir_path is given then the resolved src is also written there as ir.
+
+    Return the paths of the written files relative to output_folder or None
+    if the NO_OUTPUT environment variable is set.
+    """
+    src, adjustments = resolve(
+        src, adjustments, profile=profile, strict_duplicates=strict_duplicates
+    )
+
+    if ir_path is not None:
+        with profile.phase("dump_ir"):
+            write_if_changed(ir_path, dump_ir(src, adjustments))
 
-    log.info("Writing fields")
-    write_fields(by_type["fields"], src, adjustments, output_folder)
-
-    log.info("Writing packets")
-    write_packets(by_type["packets"], src, adjustments, output_folder)
+    if os.environ.get("NO_OUTPUT") == "1":
+        return None
+
+    rendered = render(src, adjustments, jobs=jobs, profile=profile)
+    with profile.phase("write"):
+        write_rendered(rendered, output_folder)
+    return list(rendered)
+
+
+def generate_variant(shared, name, adjustments):
+    """Generate one variant for generate_variants"""
+    src, output_folder, strict_duplicates = shared
+    try:
+        resolved, resolved_adjustments = resolve(
+            copy_src(src), adjustments, strict_duplicates=strict_duplicates
+        )
+        rendered = render(resolved, resolved_adjustments)
+    except DelfickError as error:
+        log.error(f"Failed to generate {name}\n{error}")
+        return {"error": str(error)}
+    return {"files": write_rendered(rendered, os.path.join(output_folder, name))}
+
+
+def generate_variants(src, variants, output_folder, jobs=1, strict_duplicates=False):
+    """
+    Generate every variant of the adjustments against the same src
+
+    variants is ``{name: adjustments}`` and each is written to
+    ``output_folder/name``. The src is normalised once and each variant
+    resolves its own copy of it. With more than one job the variants are made
+    by worker processes that are each sent the normalised src once.
+
+    Return ``{name: {"files": {path: "written" or "unchanged"}}}`` with
+    ``{"error": str}`` instead of files for the variants that failed.
+    """
+    if not isinstance(src, (FastSrc, Src)):
+        src = normalise(src)
+
+    shared = (src, output_folder, strict_duplicates)
+    results = run_in_order(generate_variant, list(variants.items()), jobs=jobs, shared=shared)
+    return dict(zip(variants, results))
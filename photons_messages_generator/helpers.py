@@ -1,26 +1,29 @@
 from photons_messages_generator import errors
 
+from functools import lru_cache
+import re
+import os
+
 valid_enum_types = ["uint8", "uint16", "uint32", "uint64", "int8", "int16", "int32", "int64"]
 valid_struct_types = valid_enum_types + ["bool", "float32", "float64", "byte"]
 
 
-def snake_to_camel(s):
-    uppercase = False
-    final = []
-    for i, ch in enumerate(s):
-        if ch == "_":
-            uppercase = True
-            continue
+# Every upper case ascii letter that isn't at the start
+camel_boundary = re.compile(r"(?!^)(?=[A-Z])")
 
-        if uppercase or i == 0:
-            ch = ch.upper()
-            uppercase = False
 
-        final.append(ch)
-    return "".join(final)
+@lru_cache(maxsize=8192)
+def snake_to_camel(s):
+    return "".join(part[:1].upper() + part[1:] for part in s.split("_"))
 
 
+@lru_cache(maxsize=8192)
 def camel_to_snake(s):
+    if s.isascii():
+        return camel_boundary.sub("_", s).lower()
+
+    # Lower casing a whole string isn't the same as lower casing each
+    # character for everything outside of ascii
     parts = []
     buf = []
 
@@ -41,6 +44,7 @@ def camel_to_snake(s):
     return "_".join(parts)
 
 
+@lru_cache(maxsize=4096)
 def convert_type(name, size_bits):
     broken = size_bits % 8 != 0
 
@@ -71,3 +75,67 @@ def convert_type(name, size_bits):
         return "T.Double"
     else:
         return f"T.{name.capitalize()}"
+
+
+def make_temporary_file(path):
+    """
+    Return ``(fd, location)`` of a new file next to path to write it through
+
+    The file is made with mode 0666 so the umask is applied to it like it is
+    with open(), rather than being owner only like files from mkstemp.
+    """
+    directory = os.path.dirname(path) or "."
+    while True:
+        name = f".{os.path.basename(path)}.{os.urandom(6).hex()}.tmp"
+        location = os.path.join(directory, name)
+        try:
+            return os.open(location, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o666), location
+        except FileExistsError:
+            pass
+
+
+def write_atomically(path, content):
+    """
+    Write content to path via a temporary file so readers never see half a file
+
+    The file keeps the mode it already had, or gets the mode open() would
+    have given it.
+    """
+    if isinstance(content, str):
+        content = content.encode()
+
+    try:
+        mode = os.stat(path).st_mode & 0o7777
+    except FileNotFoundError:
+        mode = None
+
+    fd, tmp = make_temporary_file(path)
+    try:
+        with os.fdopen(fd, "wb") as fle:
+            if mode is not None:
+                os.fchmod(fle.fileno(), mode)
+            fle.write(content)
+        os.replace(tmp, path)
+    except:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+
+def write_if_changed(path, content):
+    """
+    Write content to path unless the file already has exactly this content
+
+    Leaving the file alone means its mtime doesn't change. Return True if the
+    file was written.
+    """
+    if isinstance(content, str):
+        content = content.encode()
+
+    if os.path.exists(path) and os.path.getsize(path) == len(content):
+        with open(path, "rb") as fle:
+            if fle.read() == content:
+                return False
+
+    write_atomically(path, content)
+    return True
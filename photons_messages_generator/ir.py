@@ -0,0 +1,273 @@
+"""
+A binary dump of the resolved src for tools that don't want to resolve it.
+
+``to_ir`` turns the resolved src into plain dictionaries, lists, strings,
+integers, booleans and None. ``dump_ir`` writes that as::
+
+    b"PMGIR\\0" | format version (uint16) | string table | value
+
+The string table is the number of strings followed by each string as its
+length and utf-8 bytes, and every string in the value is an index into it.
+Each value starts with a one byte tag. Lengths, indexes and integers are
+varints, with integers zigzag encoded so small negative numbers stay small.
+
+``load_ir`` reads those bytes back into the same plain structures.
+"""
+from photons_messages_generator.layouts import is_inline_struct, field_width
+from photons_messages_generator import field_types as ft
+from photons_messages_generator import errors
+
+import struct
+
+MAGIC = b"PMGIR\0"
+
+# Bump this if what to_ir makes or how it is written changes
+IR_FORMAT = 1
+
+header = struct.Struct("<6sH")
+double = struct.Struct("<d")
+
+NONE, FALSE, TRUE, INT, STR, LIST, DICT, FLOAT = range(8)
+
+
+def describe_type(typ):
+    if isinstance(typ, ft.SimpleType):
+        return {"kind": "simple", "type": typ.val, "multiples": typ.multiples}
+    elif isinstance(typ, ft.StringType):
+        return {"kind": "string"}
+    elif isinstance(typ, ft.EnumType):
+        return {
+            "kind": "enum",
+            "enum": typ.enum.name,
+            "allow_unknown": typ.allow_unknown,
+            "multiples": typ.multiples,
+        }
+    elif isinstance(typ, ft.StructType):
+        return {
+            "kind": "struct",
+            "struct": typ.struct.name,
+            "multiples": typ.multiples,
+            "ignored": bool(typ.ignored),
+        }
+    elif isinstance(typ, ft.UnionType):
+        return {"kind": "union", "union": typ.union.name, "switch_field": typ.switch_field}
+    elif isinstance(typ, ft.SpecialType):
+        options = typ.options
+        return {
+            "kind": "special",
+            "name": options.name,
+            "type": options.type,
+            "multiples": options.multiples,
+        }
+    elif isinstance(typ, ft.OverrideType):
+        return {"kind": "override", "override": typ.override}
+    else:
+        raise errors.GeneratorError("Can't describe an unresolved type", got=repr(typ))
+
+
+def describe_fields(fields):
+    return [
+        {
+            "name": field.name,
+            "type": describe_type(field.type),
+            "inline": is_inline_struct(field),
+            "size_bits": field_width(field),
+            "default": field.default,
+            "extras": list(field.extras),
+        }
+        for field in fields
+    ]
+
+
+def to_ir(src, adjustments):
+    """Return the resolved src as plain structures"""
+    structs = []
+    for group in src.groups:
+        multi = group.multi_options
+        structs.append(
+            {
+                "name": group.name,
+                "size_bytes": group.size_bytes,
+                "ignored": group.full_name in adjustments.ignore,
+                "multi_name": None if multi is None else multi.name,
+                "multi_cache_amount": None if multi is None else multi.cache_amount,
+                "fields": describe_fields(group.item_fields),
+            }
+        )
+
+    unions = []
+    for union in src.unions:
+        union_enum = getattr(union, "union_enum", None)
+        unions.append(
+            {
+                "name": union.name,
+                "size_bytes": union.size_bytes,
+                "union_enum": union_enum,
+                "fields": describe_fields(union.item_fields),
+            }
+        )
+
+    packets = []
+    for packet in src.packets:
+        parent = adjustments.changes.get(packet.full_name)
+        using = parent.using.name if parent and parent.using is not None else None
+        multi = parent.multi if parent else None
+        packets.append(
+            {
+                "name": packet.name,
+                "namespace": packet.namespace,
+                "pkt_type": packet.pkt_type,
+                "size_bytes": packet.size_bytes,
+                "using": using,
+                "multi": multi,
+                "fields": describe_fields(packet.item_fields),
+            }
+        )
+
+    return {
+        "enums": [
+            {
+                "name": enum.name,
+                "type": enum.type,
+                "values": [[value.name, value.value] for value in enum.values],
+            }
+            for enum in src.enums
+        ],
+        "structs": structs,
+        "unions": unions,
+        "packets": packets,
+    }
+
+
+def write_varint(out, num):
+    while num > 0x7F:
+        out.append((num & 0x7F) | 0x80)
+        num >>= 7
+    out.append(num)
+
+
+def encode(value):
+    """Return the bytes for this value"""
+    strings = {}
+    body = bytearray()
+
+    def string(s):
+        if s not in strings:
+            strings[s] = len(strings)
+        write_varint(body, strings[s])
+
+    def write(value):
+        if value is None:
+            body.append(NONE)
+        elif value is True:
+            body.append(TRUE)
+        elif value is False:
+            body.append(FALSE)
+        elif type(value) is int:
+            body.append(INT)
+            write_varint(body, value * 2 if value >= 0 else -value * 2 - 1)
+        elif type(value) is str:
+            body.append(STR)
+            string(value)
+        elif type(value) is float:
+            body.append(FLOAT)
+            body.extend(double.pack(value))
+        elif isinstance(value, (list, tuple)):
+            body.append(LIST)
+            write_varint(body, len(value))
+            for item in value:
+                write(item)
+        elif isinstance(value, dict):
+            body.append(DICT)
+            write_varint(body, len(value))
+            for key, item in value.items():
+                string(key)
+                write(item)
+        else:
+            raise errors.GeneratorError("Can't put this in the ir", got=repr(value))
+
+    write(value)
+
+    out = bytearray(header.pack(MAGIC, IR_FORMAT))
+    write_varint(out, len(strings))
+    for s in strings:
+        encoded = s.encode()
+        write_varint(out, len(encoded))
+        out.extend(encoded)
+    out.extend(body)
+    return bytes(out)
+
+
+def decode(data):
+    """Return the value in these bytes from encode"""
+    if len(data) < header.size:
+        raise errors.BadIR("Too short to be an ir file")
+
+    magic, version = header.unpack_from(data)
+    if magic != MAGIC:
+        raise errors.BadIR("Not an ir file")
+    if version != IR_FORMAT:
+        raise errors.BadIR("Unsupported ir format", got=version, want=IR_FORMAT)
+
+    data = memoryview(data)
+    pos = header.size
+
+    def varint():
+        nonlocal pos
+        num = shift = 0
+        while True:
+            byte = data[pos]
+            pos += 1
+            num |= (byte & 0x7F) << shift
+            if byte < 0x80:
+                return num
+            shift += 7
+
+    def read():
+        nonlocal pos
+        tag = data[pos]
+        pos += 1
+        if tag == STR:
+            return strings[varint()]
+        elif tag == INT:
+            num = varint()
+            return num >> 1 if num & 1 == 0 else -((num + 1) >> 1)
+        elif tag == DICT:
+            return {strings[varint()]: read() for _ in range(varint())}
+        elif tag == LIST:
+            return [read() for _ in range(varint())]
+        elif tag == NONE:
+            return None
+        elif tag == TRUE:
+            return True
+        elif tag == FALSE:
+            return False
+        elif tag == FLOAT:
+            pos += double.size
+            return double.unpack_from(data, pos - double.size)[0]
+        raise errors.BadIR("Unknown tag", tag=tag, position=pos - 1)
+
+    try:
+        strings = []
+        for _ in range(varint()):
+            length = varint()
+            strings.append(str(data[pos : pos + length], "utf-8"))
+            pos += length
+
+        value = read()
+    except (IndexError, UnicodeDecodeError) as error:
+        raise errors.BadIR("Ir file is corrupt", error=str(error))
+
+    if pos != len(data):
+        raise errors.BadIR("Found more after the ir", extra=len(data) - pos)
+    return value
+
+
+def dump_ir(src, adjustments):
+    """Return the ir bytes for this resolved src"""
+    return encode(to_ir(src, adjustments))
+
+
+def load_ir(data):
+    """Return the plain structures in these bytes from dump_ir"""
+    return decode(data)
@@ -0,0 +1,163 @@
+"""
+Where each field of a resolved struct or packet sits in its bytes and, where
+possible, the ``struct`` format that packs those bytes.
+
+A struct used once without ``[1]`` is written as ``*fields.Struct`` and so its
+fields become fields of the parent. Those are inlined here as well, so a
+layout lists the same fields photons ends up with.
+"""
+from photons_messages_generator.helpers import snake_to_camel
+from photons_messages_generator import field_types as ft
+
+import struct
+
+struct_codes = {
+    "uint8": "B",
+    "int8": "b",
+    "uint16": "H",
+    "int16": "h",
+    "uint32": "I",
+    "int32": "i",
+    "uint64": "Q",
+    "int64": "q",
+    "float32": "f",
+    "float64": "d",
+    "bool": "?",
+}
+
+# Extras that photons doesn't use to change the value it unpacked
+value_preserving_extras = ("default(", "optional(")
+
+
+def is_inline_struct(field):
+    """Whether this field is written as the fields of its struct"""
+    return (
+        isinstance(field.type, ft.StructType)
+        and field.type.multiples == 1
+        and not field.original_type.startswith("[")
+    )
+
+
+def field_width(field):
+    """The number of bits this field takes up"""
+    return field.size_bits
+
+
+def fields_size_bits(fields):
+    """The number of bits these fields take up"""
+    return sum(field_width(field) for field in flat_fields(fields))
+
+
+def flat_fields(fields):
+    """Yield these fields with the fields of inline structs in their place"""
+    for field in fields:
+        if is_inline_struct(field):
+            yield from flat_fields(field.type.struct.item_fields)
+        else:
+            yield field
+
+
+def layout(fields, offset=0):
+    """Yield ``(name, offset_bits, width_bits)`` for these fields"""
+    for field in flat_fields(fields):
+        width = field_width(field)
+        yield field.name, offset, width
+        offset += width
+
+
+def struct_code(field):
+    """
+    Return ``(code, None)`` for this field in a ``struct`` format or ``(None, reason)``
+
+    Only whole bytes of numbers, bytes and strings can be unpacked without
+    photons changing the value afterwards.
+    """
+    typ = field.type
+    if isinstance(typ, ft.UnionType):
+        return None, "is a union"
+    elif isinstance(typ, ft.StructType):
+        return None, "is a list of structs"
+    elif isinstance(typ, ft.SpecialType):
+        return None, f"uses the special type {typ.options.name}"
+    elif not isinstance(typ, (ft.SimpleType, ft.StringType, ft.EnumType)):
+        return None, "has an overridden type"
+
+    if any(not extra.startswith(value_preserving_extras) for extra in field.extras):
+        return None, "has extras that may change the value"
+
+    if field_width(field) % 8 != 0:
+        if isinstance(typ, ft.SimpleType) and typ.val == "reserved":
+            return None, "is reserved for part of a byte"
+        return None, "is part of a byte"
+
+    num_bytes = field_width(field) // 8
+    if isinstance(typ, ft.StringType):
+        return f"{num_bytes}s", None
+
+    if isinstance(typ, ft.EnumType):
+        val, multiples = typ.enum.type, typ.multiples
+    else:
+        val, multiples = typ.val, typ.multiples
+
+    if val == "reserved":
+        return f"{num_bytes}x", None
+    elif val == "byte":
+        return f"{num_bytes}s", None
+
+    code = struct_codes.get(val)
+    if code is None:
+        return None, f"has the unknown type {val}"
+
+    if struct.calcsize(f"<{code}") * multiples != num_bytes:
+        return None, f"isn't {multiples} whole {val}"
+
+    return code if multiples == 1 else f"{multiples}{code}", None
+
+
+def struct_format(fields, size_bytes):
+    """
+    Return ``(format, None)`` for these fields or ``(None, reason)``
+
+    The format is little endian without padding and must be size_bytes long.
+    """
+    codes = []
+    for field in flat_fields(fields):
+        code, reason = struct_code(field)
+        if reason is not None:
+            return None, f"{field.name} {reason}"
+        codes.append(code)
+
+    fmt = f"<{''.join(codes)}"
+    if struct.calcsize(fmt) != size_bytes:
+        return None, f"fields are {struct.calcsize(fmt)} bytes rather than {size_bytes}"
+
+    return fmt, None
+
+
+def struct_layouts(src, adjustments):
+    """Yield ``(name, size_bytes, layout)`` for every struct in fields.py"""
+    for group in src.groups:
+        if group.full_name not in adjustments.ignore:
+            yield group.name, group.size_bytes, list(layout(group.item_fields))
+
+
+def namespaced_packets(by_namespace, by_output):
+    """
+    Yield ``(klsname, packets)`` for each namespace that a packets output writes
+
+    by_namespace and by_output are from ``generate.packet_namespaces``, so the
+    namespaces are in the order they are written. Packets are ordered by their
+    pkt_type.
+    """
+    for namespaces in by_output.values():
+        for namespace in namespaces:
+            packets = sorted(by_namespace[namespace], key=lambda pkt: pkt.pkt_type)
+            yield f"{snake_to_camel(namespace)}Messages", packets
+
+
+def packet_layouts(by_namespace, by_output):
+    """Yield ``(klsname, [(name, size_bytes, layout), ...])`` for each namespace"""
+    for klsname, packets in namespaced_packets(by_namespace, by_output):
+        yield klsname, [
+            (packet.name, packet.size_bytes, list(layout(packet.item_fields))) for packet in packets
+        ]
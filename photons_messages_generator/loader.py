@@ -0,0 +1,103 @@
+from photons_messages_generator.helpers import write_atomically
+from photons_messages_generator.cache import digest
+
+import logging
+import pickle
+import time
+import os
+
+log = logging.getLogger("generator.loader")
+
+# Bump this if the shape of what we pickle changes
+DOCUMENT_CACHE_FORMAT = 1
+
+
+def make_yaml():
+    """
+    Return a safe ruamel YAML object
+
+    ruamel uses the libyaml backed parser from ruamel.yaml.clib when that is
+    installed and otherwise falls back to the pure python parser. It's
+    imported here so that using the DocumentCache doesn't import ruamel.
+    """
+    from ruamel.yaml import YAML
+
+    return YAML(typ="safe")
+
+
+class DocumentCache:
+    """
+    Parsed yaml documents pickled by the hash of their content
+
+    Loading the pickle is much quicker than parsing the yaml again. Only the
+    most recently used ``keep`` documents are kept.
+    """
+
+    def __init__(self, cache_dir, keep=16):
+        self.keep = keep
+        self.folder = os.path.join(cache_dir, "documents")
+
+    def location(self, key):
+        return os.path.join(self.folder, f"{key}.pickle")
+
+    def get(self, key):
+        location = self.location(key)
+        if not os.path.exists(location):
+            return False, None
+
+        try:
+            with open(location, "rb") as fle:
+                fmt, document = pickle.load(fle)
+        except Exception as error:
+            log.warning(f"Ignoring unreadable cached document {location}: {error}")
+            return False, None
+
+        if fmt != DOCUMENT_CACHE_FORMAT:
+            return False, None
+
+        os.utime(location)
+        return True, document
+
+    def set(self, key, document):
+        os.makedirs(self.folder, exist_ok=True)
+        content = pickle.dumps((DOCUMENT_CACHE_FORMAT, document), pickle.HIGHEST_PROTOCOL)
+        write_atomically(self.location(key), content)
+        self.prune()
+
+    def prune(self):
+        found = []
+        for name in os.listdir(self.folder):
+            if name.endswith(".pickle"):
+                location = os.path.join(self.folder, name)
+                found.append((os.path.getmtime(location), location))
+
+        for _, location in sorted(found, reverse=True)[self.keep :]:
+            os.remove(location)
+
+
+def load_yaml(content, *, cache=None, name="yaml"):
+    """
+    Parse the yaml in content
+
+    If a DocumentCache is provided then we return the cached document for this
+    content if there is one, and otherwise remember what we parsed.
+    """
+    start = time.perf_counter()
+
+    key = None
+    if cache is not None:
+        key = digest(content)
+        found, document = cache.get(key)
+        if found:
+            log.info(f"Loaded {name} from the cache in {time.perf_counter() - start:.3f}s")
+            return document
+
+    yaml = make_yaml()
+    document = yaml.load(content)
+    how = "C" if yaml.Parser.__name__ == "CParser" else "pure python"
+    log.info(f"Parsed {name} with the {how} loader in {time.perf_counter() - start:.3f}s")
+
+    if cache is not None:
+        cache.set(key, document)
+
+    return document
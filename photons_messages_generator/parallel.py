@@ -0,0 +1,52 @@
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+import os
+
+# What run_in_order gave to every task in a worker, see _receive
+_shared = None
+
+
+def _receive(shared):
+    global _shared
+    _shared = shared
+
+
+def _call(func, args):
+    return func(_shared, *args)
+
+
+def start_method():
+    """
+    How to start workers
+
+    Forking a process that has threads can leave locks held in the child, so
+    we use a fork server where there is one and otherwise spawn workers.
+    """
+    methods = multiprocessing.get_all_start_methods()
+    return "forkserver" if "forkserver" in methods else "spawn"
+
+
+def run_in_order(func, arguments, jobs=1, shared=None):
+    """
+    Return ``[func(shared, *args) for args in arguments]``
+
+    With more than one job the calls are made by a pool of worker processes.
+    func must be a module level function so the workers can import it, and
+    shared and the arguments must be picklable. shared is sent to each
+    worker once rather than with every call. We never use more jobs than
+    there are cpus, so with only one cpu the calls are made in this process.
+
+    The results are always in the order of the arguments. If a call fails
+    then its exception is raised, with the traceback from the worker as its
+    cause, for the first failing call like a serial run would.
+    """
+    jobs = min(jobs, len(arguments), os.cpu_count() or 1)
+    if jobs <= 1:
+        return [func(shared, *args) for args in arguments]
+
+    context = multiprocessing.get_context(start_method())
+    with ProcessPoolExecutor(
+        jobs, mp_context=context, initializer=_receive, initargs=(shared,)
+    ) as executor:
+        futures = [executor.submit(_call, func, args) for args in arguments]
+        return [future.result() for future in futures]
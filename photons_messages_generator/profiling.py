@@ -0,0 +1,94 @@
+from contextlib import contextmanager
+import logging
+import json
+import time
+import sys
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+log = logging.getLogger("generator.profiling")
+
+
+def peak_memory():
+    """Return the peak resident memory of this process in bytes or None if we can't tell"""
+    if resource is None:
+        return None
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == "darwin":
+        return peak
+    return peak * 1024
+
+
+class NoProfile:
+    """Used when we aren't profiling so that recording is a no-op"""
+
+    enabled = False
+    cprofile_path = None
+
+    @contextmanager
+    def phase(self, name):
+        yield
+
+    def record(self, name, seconds):
+        pass
+
+    def count(self, name, amount):
+        pass
+
+
+no_profile = NoProfile()
+
+
+class Profile:
+    """
+    Records how long each phase of generating takes and how much was processed
+
+    Phases may be nested and are reported in the order they started. If
+    cprofile_path is set then the resolve stage is run under cProfile and the
+    stats are dumped to that path.
+    """
+
+    enabled = True
+
+    def __init__(self, cprofile_path=None):
+        self.cprofile_path = cprofile_path
+        self.phases = []
+        self.counts = {}
+
+    @contextmanager
+    def phase(self, name):
+        info = {"name": name}
+        self.phases.append(info)
+
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            info["seconds"] = round(time.perf_counter() - start, 6)
+            info["peak_memory_bytes"] = peak_memory()
+
+    def record(self, name, seconds):
+        """Record a phase that was timed by the caller"""
+        self.phases.append(
+            {"name": name, "seconds": round(seconds, 6), "peak_memory_bytes": peak_memory()}
+        )
+
+    def count(self, name, amount):
+        self.counts[name] = self.counts.get(name, 0) + amount
+
+    def as_dict(self):
+        return {"phases": self.phases, "counts": self.counts, "peak_memory_bytes": peak_memory()}
+
+    def dump(self, path):
+        """Write the profile as json to path, or to the log if path is -"""
+        content = json.dumps(self.as_dict(), indent=2)
+        if path == "-":
+            log.info(f"Profile\n{content}")
+        else:
+            with open(path, "w") as fle:
+                fle.write(content)
+                fle.write("\n")
@@ -1,56 +1,254 @@
 from photons_messages_generator.helpers import camel_to_snake, snake_to_camel
-from photons_messages_generator.src import CloneStruct, struct_field_spec
+from photons_messages_generator.src import CloneStruct
+from photons_messages_generator.fast_src import StructField
+from photons_messages_generator.adjustments import no_field_adjustment
+from photons_messages_generator.layouts import fields_size_bits
+from photons_messages_generator.profiling import no_profile
 from photons_messages_generator import field_types as ft
 from photons_messages_generator import errors
 
-from delfick_project.norms import Meta
+from delfick_project.norms import sb
 from delfick_project.logging import lc
 from collections import defaultdict
 import keyword
 import logging
+import time
 
 log = logging.getLogger("generator.resolver")
 
 
+class SymbolIndex:
+    """
+    Lookup of enums, structs, packets and unions by their full_name
+
+    When names are duplicated the first one wins, which matches what a scan
+    over the src would find.
+    """
+
+    def __init__(self, src):
+        self.enums = {}
+        self.structs = {}
+        self.packets = {}
+        self.unions = {}
+
+        for enum in src.enums:
+            self.enums.setdefault(enum.full_name, enum)
+        for struct in src.groups:
+            self.structs.setdefault(struct.full_name, struct)
+        for packet in src.packets:
+            self.packets.setdefault(packet.full_name, packet)
+        for union in src.unions:
+            self.unions.setdefault(union.full_name, union)
+
+
+class Pass:
+    """
+    One step of resolving the src
+
+    kind says how run is called:
+
+    global
+        run() is called once
+
+    parent
+        run(parent, is_packet) is called for every struct, packet and union
+
+    packet
+        run(packet) is called for every packet
+
+    field
+        run(parent_full_name, fields) is called with the fields of every parent
+        and must treat each field on its own
+
+    after is the names of passes that must have finished with every parent
+    before this pass may start, and reports says whether this pass can raise
+    an error or log a warning.
+    """
+
+    def __init__(self, run, kind, *, after=(), reports=False):
+        self.run = run
+        self.kind = kind
+        self.after = after
+        self.reports = reports
+
+    @property
+    def name(self):
+        return self.run.__name__
+
+    def visit(self, parent, is_packet, in_src_packets):
+        if self.kind == "field":
+            self.run(parent.full_name, parent.item_fields)
+        elif self.kind == "parent":
+            self.run(parent, is_packet)
+        elif in_src_packets:
+            self.run(parent)
+
+
+def schedule(passes):
+    """
+    Group passes into traversals that each walk the src once
+
+    Passes stay in order and a pass joins the traversal before it unless it
+    depends on a pass in that traversal or they can both report. Keeping one
+    pass that reports per traversal means errors and warnings come out in the
+    same order as if every pass had its own traversal.
+    """
+    traversals = []
+    for p in passes:
+        if traversals and p.kind != "global" and traversals[-1][0].kind != "global":
+            current = traversals[-1]
+            depends = any(c.name in p.after for c in current)
+            both_report = p.reports and any(c.reports for c in current)
+            if not depends and not both_report:
+                current.append(p)
+                continue
+        traversals.append([p])
+    return traversals
+
+
 class Resolver:
-    def __init__(self, src, adjustments):
+    def __init__(self, src, adjustments, profile=no_profile, strict_duplicates=False):
         self.src = src
+        self.profile = profile
+        self.strict_duplicates = strict_duplicates
         self.adjustments = adjustments
+        self.symbols = SymbolIndex(src)
+        self.field_adjustments = {}
+        self.enum_names = None
+        self.snake_fields = set()
 
     def resolve(self):
         for struct in self.src.groups:
             struct.multi_options = self.adjustments.multi_options(struct.full_name)
 
         by_fields = defaultdict(list)
-        for packet in self.all_packets:
-            if packet.item_fields:
-                fields = tuple((field.full_name, field.type) for field in packet.item_fields)
-                by_fields[fields].append(packet)
-
-        self.resolve_using()
-        self.validate_bits()
-        self.fix_packet_names()
-
-        self.register_clones()
-        self.resolve_namespaces()
-        self.resolve_field_extras()
-        self.resolve_types()
-        self.resolve_renames()
-        self.resolve_packet_fields()
-        self.resolve_field_unions()
-        self.generate_clones()
-
-        self.fix_field_names()
-        self.validate_field_names()
-        self.rename_namespaces()
-
-        for packets in by_fields.values():
-            if len(packets) > 1:
-                diff = False
-                for packet in packets:
-                    if not diff:
-                        for compare in [p for p in packets if p is not packet]:
-                            diff = self.compare_fields(packet, compare)
+        if self.strict_duplicates:
+            for packet in self.all_packets:
+                if packet.item_fields:
+                    fields = tuple((field.full_name, field.type) for field in packet.item_fields)
+                    by_fields[fields].append(packet)
+
+        for traversal in schedule(self.passes()):
+            if len(traversal) == 1:
+                with self.profile.phase(f"resolve.{traversal[0].name}"):
+                    self.traverse(traversal)
+            else:
+                names = "+".join(p.name for p in traversal)
+                with self.profile.phase(f"resolve.{names}"):
+                    self.traverse(traversal)
+
+        if self.strict_duplicates:
+            with self.profile.phase("resolve.compare_duplicates"):
+                for packets in by_fields.values():
+                    if len(packets) > 1:
+                        self.compare_duplicates(packets)
+
+    def passes(self):
+        return [
+            Pass(self.resolve_using, "parent", reports=True),
+            Pass(self.compile_field_adjustments, "global", after=["resolve_using"]),
+            Pass(self.validate_bits, "field", after=["compile_field_adjustments"], reports=True),
+            Pass(self.fix_packet_names, "packet", reports=True),
+            Pass(self.register_clones, "global", reports=True),
+            Pass(self.resolve_namespaces, "packet", after=["resolve_using"]),
+            Pass(self.resolve_field_extras, "field", after=["compile_field_adjustments"]),
+            Pass(
+                self.resolve_types,
+                "field",
+                after=["compile_field_adjustments", "register_clones"],
+                reports=True,
+            ),
+            # Errors from resolve_types show the names of enums and structs
+            Pass(self.resolve_enum_renames, "global", after=["resolve_types"]),
+            Pass(self.resolve_renames, "parent", after=["resolve_types"]),
+            # Expanding a field copies the resolved and renamed fields of another struct
+            Pass(
+                self.resolve_packet_fields,
+                "parent",
+                after=["resolve_types", "resolve_renames"],
+                reports=True,
+            ),
+            Pass(
+                self.resolve_field_unions,
+                "field",
+                after=["resolve_packet_fields", "resolve_enum_renames"],
+                reports=True,
+            ),
+            Pass(self.generate_clones, "global", after=["resolve_packet_fields"], reports=True),
+            Pass(self.fix_enum_names, "global", reports=True),
+            Pass(self.fix_field_names, "parent", after=["generate_clones"]),
+            Pass(self.validate_field_names, "field", after=["generate_clones"], reports=True),
+            Pass(self.rename_namespaces, "packet", after=["resolve_namespaces"]),
+            Pass(self.validate_sizes, "global", reports=True),
+        ]
+
+    def traverse(self, passes):
+        """
+        Run these passes in one walk over every struct, packet and union
+
+        For each parent we run every pass in order before moving to the next
+        parent. When profiling, the time each pass takes is added up and
+        recorded as a phase for that pass.
+        """
+        if passes[0].kind == "global":
+            passes[0].run()
+            return
+
+        if not self.profile.enabled or len(passes) == 1:
+            for parent, is_packet, in_src_packets in self.traversal_order:
+                for p in passes:
+                    p.visit(parent, is_packet, in_src_packets)
+            return
+
+        took = dict.fromkeys((p.name for p in passes), 0)
+        for parent, is_packet, in_src_packets in self.traversal_order:
+            for p in passes:
+                start = time.perf_counter()
+                p.visit(parent, is_packet, in_src_packets)
+                took[p.name] += time.perf_counter() - start
+
+        for name, seconds in took.items():
+            self.profile.record(f"resolve.{name}", seconds)
+
+    @property
+    def traversal_order(self):
+        for struct in self.src.groups:
+            if not isinstance(struct, CloneStruct):
+                yield struct, False, False
+
+        for packet in self.src.packets:
+            yield packet, True, True
+
+        for union in self.src.unions:
+            yield union, True, False
+
+    def compare_duplicates(self, packets):
+        """
+        Warn about differences between packets that started with the same fields
+
+        Packets with the same fingerprint have nothing for compare_fields to
+        find, so we only compare packets with different fingerprints.
+        """
+        found = {}
+        fingerprints = {}
+        for packet in packets:
+            fingerprints[id(packet)] = found.setdefault(self.fingerprint(packet), len(found))
+
+        if len(found) == 1:
+            return
+
+        diff = False
+        for packet in packets:
+            if not diff:
+                for compare in [p for p in packets if p is not packet]:
+                    if fingerprints[id(packet)] == fingerprints[id(compare)]:
+                        diff = False
+                    else:
+                        diff = self.compare_fields(packet, compare)
+
+    def fingerprint(self, packet):
+        """The parts of each field that compare_fields looks at"""
+        return tuple((f.name, repr(f.type), f.default, repr(f.extras)) for f in packet.item_fields)
 
     def compare_fields(self, one, two):
         names_one = [f.name for f in one.item_fields]
@@ -101,9 +299,9 @@ class Resolver:
                     **{one.name: f1_info, two.name: f2_info},
                 )
 
-    def validate_bits(self):
-        for parent_full_name, field in self.all_fields:
-            bits = self.adjustments.field_attr(parent_full_name, field.full_name, "bits")
+    def validate_bits(self, parent_full_name, fields):
+        for field in fields:
+            bits = self.field_adjustment(parent_full_name, field.full_name).bits
             if bits:
                 if len(bits) != field.size_bits:
                     raise errors.InvalidBits(
@@ -112,12 +310,32 @@ class Resolver:
                         field=field.full_name,
                     )
 
+    def validate_sizes(self):
+        """
+        Complain about structs and packets with fields that don't add up to size_bytes
+
+        This is a warning unless the adjustments say strict_sizes. The fields of
+        a union are alternatives to each other and so unions aren't checked.
+        """
+        for kind, parents in (("struct", self.src.groups), ("packet", self.src.packets)):
+            for parent in parents:
+                size_bits = fields_size_bits(parent.item_fields)
+                if size_bits != parent.size_bytes * 8:
+                    error = errors.WrongSizeBytes(
+                        f"Fields add up to {size_bits} bits rather than {parent.size_bytes} bytes",
+                        **{kind: parent.full_name},
+                    )
+                    if self.adjustments.strict_sizes:
+                        raise error
+                    log.warning(error)
+
     def register_clones(self):
-        names = [s.full_name for s in self.src.groups]
         for name, clone in self.adjustments.clones.items():
-            if name in names:
+            if name in self.symbols.structs:
                 raise errors.OverridingStructWithClone(existing=name)
-            self.src.groups.append(CloneStruct(name=name, multi_options=clone.multi_options))
+            struct = CloneStruct(name=name, multi_options=clone.multi_options)
+            self.src.groups.append(struct)
+            self.symbols.structs[name] = struct
 
     def generate_clones(self):
         for name, clone in self.adjustments.clones.items():
@@ -125,23 +343,37 @@ class Resolver:
             struct.name = name
             struct.full_name = name
             self.src.groups.insert(0, struct)
+            self.symbols.structs[name] = struct
         self.src.groups = [s for s in self.src.groups if not isinstance(s, CloneStruct)]
 
-    def resolve_using(self):
-        for parent, _ in self.all_parents:
-            using = self.adjustments.using_for(parent.full_name)
-            if using:
-                using = self.find_packet(using)
-                if using.pkt_type > parent.pkt_type:
-                    raise errors.BadUsingInstruction(
-                        "The pkt_type of the used message must be less than the packet",
-                        packet=parent.full_name,
-                        using=parent.full_name,
-                        packet_pkt_type=parent.pkt_type,
-                        using_pkt_type=using.pkt_type,
-                    )
-                self.ensure_using_instruction_is_correct(parent, using)
-                self.adjustments.change_using(parent.full_name, using)
+        if self.adjustments.clones:
+            # Fields that use a clone were given the placeholder from register_clones
+            for parent, _, _ in self.traversal_order:
+                for field in parent.item_fields:
+                    typ = field.type
+                    if isinstance(typ, ft.StructType) and isinstance(typ.struct, CloneStruct):
+                        typ.struct = self.symbols.structs[typ.struct.name]
+
+    def resolve_using(self, parent, is_packet):
+        using = self.adjustments.using_for(parent.full_name)
+        if using:
+            using = self.find_packet(using)
+            if using.pkt_type > parent.pkt_type:
+                raise errors.BadUsingInstruction(
+                    "The pkt_type of the used message must be less than the packet",
+                    packet=parent.full_name,
+                    using=parent.full_name,
+                    packet_pkt_type=parent.pkt_type,
+                    using_pkt_type=using.pkt_type,
+                )
+            self.ensure_using_instruction_is_correct(parent, using)
+            self.adjustments.change_using(parent.full_name, using)
+
+    def compile_field_adjustments(self):
+        self.field_adjustments = self.adjustments.compile_field_adjustments()
+
+    def field_adjustment(self, parent, field):
+        return self.field_adjustments.get((parent, field), no_field_adjustment)
 
     @property
     def all_packets(self):
@@ -150,54 +382,41 @@ class Resolver:
         for union in self.src.unions:
             yield union
 
-    def rename_namespaces(self):
-        for packet in self.src.packets:
-            rename = self.adjustments.rename_namespaces.get(packet.namespace)
-            if rename:
-                packet.namespace = rename
+    def rename_namespaces(self, packet):
+        rename = self.adjustments.rename_namespaces.get(packet.namespace)
+        if rename:
+            packet.namespace = rename
 
-    def resolve_namespaces(self):
-        for packet in self.src.packets:
-            namespace = self.adjustments.packet_namespace(packet.full_name)
-            if namespace is not None:
-                packet.namespace = namespace
-
-    def resolve_field_extras(self):
-        for parent_full_name, field in self.all_fields:
-            field.default = self.adjustments.field_attr(
-                parent_full_name, field.full_name, "default"
-            )
+    def resolve_namespaces(self, packet):
+        namespace = self.adjustments.packet_namespace(packet.full_name)
+        if namespace is not None:
+            packet.namespace = namespace
 
-            field.extras = self.adjustments.field_attr(
-                parent_full_name, field.full_name, "extras", []
-            )
+    def resolve_field_extras(self, parent_full_name, fields):
+        for field in fields:
+            adjustment = self.field_adjustment(parent_full_name, field.full_name)
+            field.default = adjustment.default
+            field.extras = adjustment.extras
 
-    def resolve_field_unions(self):
-        for parent_full_name, field in self.all_fields:
-            field.union_enum = self.adjustments.field_attr(
-                parent_full_name, field.full_name, "union_enum"
-            )
-            field.union_switch_field = self.adjustments.field_attr(
-                parent_full_name, field.full_name, "union_switch_field"
-            )
+    def resolve_field_unions(self, parent_full_name, fields):
+        for field in fields:
+            adjustment = self.field_adjustment(parent_full_name, field.full_name)
+            field.union_enum = adjustment.union_enum
+            field.union_switch_field = adjustment.union_switch_field
 
             if field.union_enum is not None:
-                found = False
-                for enum in self.src.enums:
-                    if enum.name == field.union_enum:
-                        found = True
-                        break
-                if not found:
+                # Enums have been renamed by now and union_enum refers to the new name
+                if self.enum_names is None:
+                    self.enum_names = set(e.name for e in self.src.enums)
+                if field.union_enum not in self.enum_names:
                     raise errors.NoSuchEnum(
                         wanted=field.union_enum, available=sorted(e.name for e in self.src.enums)
                     )
 
-    def resolve_types(self):
-        for parent_full_name, field in self.all_fields:
+    def resolve_types(self, parent_full_name, fields):
+        for field in fields:
             if field.full_name and field.full_name.startswith("Reserved"):
-                field.name = self.adjustments.field_attr(
-                    parent_full_name, field.full_name, "rename"
-                )
+                field.name = self.field_adjustment(parent_full_name, field.full_name).rename
                 field.full_name = None
                 field.type = "reserved"
 
@@ -214,87 +433,82 @@ class Resolver:
                 ),
             )
 
-    def resolve_packet_fields(self):
-        for parent, _ in self.all_parents:
-            fields = []
-            for field in parent.item_fields:
-                bits = self.adjustments.field_attr(parent.full_name, field.full_name, "bits")
-                if bits:
-                    for name in bits:
-                        meta = Meta({}, []).at(parent.full_name).at(field.full_name).at(name)
-                        f = struct_field_spec().normalise(
-                            meta, {"name": name, "type": "bit", "size_bits": 0}
-                        )
-                        f.type = ft.SimpleType("bit", 1)
-                        fields.append(f)
-                    continue
-
-                if isinstance(field.type, ft.UnionType):
-                    fields.append(field)
-                elif getattr(field.type, "expanded", False):
-                    expand_structs = isinstance(field.type, ft.PacketType)
-                    fields.extend(field.expand_fields(expand_structs=expand_structs))
-                else:
-                    fields.append(field)
-            parent.item_fields = fields
+    def resolve_packet_fields(self, parent, is_packet):
+        fields = []
+        for field in parent.item_fields:
+            bits = self.field_adjustment(parent.full_name, field.full_name).bits
+            if bits:
+                for name in bits:
+                    f = StructField(name, name, "bit", "bit", 1, sb.NotSpecified, None, [])
+                    f.type = ft.SimpleType("bit", 1)
+                    fields.append(f)
+                continue
 
-    def resolve_renames(self):
+            if isinstance(field.type, ft.UnionType):
+                fields.append(field)
+            elif getattr(field.type, "expanded", False):
+                expand_structs = isinstance(field.type, ft.PacketType)
+                fields.extend(field.expand_fields(expand_structs=expand_structs))
+            else:
+                fields.append(field)
+        parent.item_fields = fields
+
+    def resolve_enum_renames(self):
         for enum in self.src.enums:
             rename = self.adjustments.rename(enum.full_name)
             if rename:
                 enum.name = rename
 
-        for parent, is_packet in self.all_parents:
-            rename = self.adjustments.rename(parent.full_name, is_struct=not is_packet)
-            if rename:
-                parent.name = rename
+    def resolve_renames(self, parent, is_packet):
+        rename = self.adjustments.rename(parent.full_name, is_struct=not is_packet)
+        if rename:
+            parent.name = rename
 
-            for field in parent.item_fields:
-                rename = self.adjustments.field_attr(parent.full_name, field.full_name, "rename")
-                if rename:
-                    field.name = rename
+        for field in parent.item_fields:
+            rename = self.field_adjustment(parent.full_name, field.full_name).rename
+            if rename:
+                field.name = rename
 
-    def fix_packet_names(self):
-        for packet in self.src.packets:
-            namespace_camel = snake_to_camel(packet.namespace)
-            if not packet.full_name.startswith(namespace_camel):
-                log.warning(
-                    lc(
-                        "Packet with weird name, expected it to start with the namesapce",
-                        expected_prefix=namespace_camel,
-                        packet_name=packet.full_name,
-                    )
+    def fix_packet_names(self, packet):
+        namespace_camel = snake_to_camel(packet.namespace)
+        if not packet.full_name.startswith(namespace_camel):
+            log.warning(
+                lc(
+                    "Packet with weird name, expected it to start with the namesapce",
+                    expected_prefix=namespace_camel,
+                    packet_name=packet.full_name,
                 )
-                continue
-
-            short = packet.full_name[len(namespace_camel) :]
-
-            if short.startswith("Get"):
-                name = f"Get{short[3:]}"
-                if name == "Get":
-                    name = f"{name}{namespace_camel}"
-            elif short.startswith("Set"):
-                name = f"Set{short[3:]}"
-                if name == "Set":
-                    name = f"{name}{namespace_camel}"
-            elif short.startswith("State"):
-                name = f"State{short[5:]}"
-                if name == "State":
-                    name = f"{namespace_camel}{name}"
-            else:
-                name = short
+            )
+            return
+
+        short = packet.full_name[len(namespace_camel) :]
+
+        if short.startswith("Get"):
+            name = f"Get{short[3:]}"
+            if name == "Get":
+                name = f"{name}{namespace_camel}"
+        elif short.startswith("Set"):
+            name = f"Set{short[3:]}"
+            if name == "Set":
+                name = f"{name}{namespace_camel}"
+        elif short.startswith("State"):
+            name = f"State{short[5:]}"
+            if name == "State":
+                name = f"{namespace_camel}{name}"
+        else:
+            name = short
 
-            packet.name = name
+        packet.name = name
 
-    def fix_field_names(self):
+    def fix_enum_names(self):
         for enum in self.src.enums:
             reserved_num = 1
+            prefix = f"{camel_to_snake(enum.full_name).upper()}_"
             for value in enum.values:
                 if value.name == "reserved":
                     value.name = f"reserved{reserved_num}".upper()
                     reserved_num += 1
                 else:
-                    prefix = f"{camel_to_snake(enum.full_name).upper()}_"
                     if value.name.startswith(prefix):
                         value.name = value.name[len(prefix) :]
                     else:
@@ -304,17 +518,19 @@ class Resolver:
                             enum=enum.name,
                         )
 
-        for parent, is_packet in self.all_parents:
-            reserved_num = self.adjustments.reserved_start(parent.full_name)
-            for field in parent.item_fields:
-                if field.name is None:
-                    field.name = f"reserved{reserved_num}"
-                    reserved_num += 1
-                else:
-                    field.name = camel_to_snake(field.name)
-
-    def validate_field_names(self):
-        for parent_full_name, field in self.all_fields:
+    def fix_field_names(self, parent, is_packet):
+        reserved_num = self.adjustments.reserved_start(parent.full_name)
+        for field in parent.item_fields:
+            if field.name is None:
+                field.name = f"reserved{reserved_num}"
+                reserved_num += 1
+            elif id(field) not in self.snake_fields:
+                # Clones share fields with the struct they were cloned from
+                self.snake_fields.add(id(field))
+                field.name = camel_to_snake(field.name)
+
+    def validate_field_names(self, parent_full_name, fields):
+        for field in fields:
             name = field.name
 
             invalid = self.adjustments.invalid_field_names
@@ -334,31 +550,13 @@ class Resolver:
                     invalid_names=keyword.kwlist,
                 )
 
-    @property
-    def all_fields(self):
-        for struct in self.src.groups:
-            if not isinstance(struct, CloneStruct):
-                for field in struct.item_fields:
-                    yield struct.full_name, field
-
-        for packet in self.all_packets:
-            for field in packet.item_fields:
-                yield packet.full_name, field
-
-    @property
-    def all_parents(self):
-        for struct in self.src.groups:
-            if not isinstance(struct, CloneStruct):
-                yield struct, False
-
-        for packet in self.all_packets:
-            yield packet, True
-
     def find_packet(self, name):
-        for packet in self.all_packets:
-            if packet.full_name == name:
-                return packet
-        raise errors.UnknownPacket(wanted=name)
+        packet = self.symbols.packets.get(name)
+        if packet is None:
+            packet = self.symbols.unions.get(name)
+        if packet is None:
+            raise errors.UnknownPacket(wanted=name)
+        return packet
 
     def ensure_is_same_type(self, typ, original, full_name):
         if not isinstance(original, ft.SimpleType):
@@ -426,43 +624,40 @@ class Resolver:
         if ignored and not ignored.expanded:
             return ft.SimpleType("byte", 1)
 
-        for enum in self.src.enums:
-            if enum.full_name == typ:
-                allow_unknown_enums = self.adjustments.field_attr(
-                    parent, field, "allow_unknown_enums", False
+        enum = self.symbols.enums.get(typ)
+        if enum is not None:
+            allow_unknown_enums = self.field_adjustment(parent, field).allow_unknown_enums
+            return ft.EnumType(enum, multiples, allow_unknown=allow_unknown_enums)
+
+        struct = self.symbols.structs.get(typ)
+        if struct is not None:
+            expanded = (ignored and ignored.expanded) and multiples == 1
+            return ft.StructType(struct, multiples, expanded=expanded, ignored=ignored)
+
+        packet = self.symbols.packets.get(typ)
+        if packet is not None:
+            return ft.PacketType(packet, multiples)
+
+        union = self.symbols.unions.get(typ)
+        if union is not None:
+            adjustment = self.field_adjustment(parent, field)
+            union_switch_field = adjustment.union_switch_field
+            union_enum = adjustment.union_enum
+            if union_switch_field is None or union_enum is None:
+                raise errors.MissingUnionOptions(
+                    parent=parent,
+                    field=field,
+                    have={"union_switch_field": union_switch_field, "union_enum": union_enum},
+                    need=["union_switch_field", "union_enum"],
                 )
-                return ft.EnumType(enum, multiples, allow_unknown=allow_unknown_enums)
 
-        for struct in self.src.groups:
-            if struct.full_name == typ:
-                expanded = (ignored and ignored.expanded) and multiples == 1
-                return ft.StructType(struct, multiples, expanded=expanded, ignored=ignored)
-
-        for packet in self.src.packets:
-            if packet.full_name == typ:
-                return ft.PacketType(packet, multiples)
-
-        for union in self.src.unions:
-            if union.full_name == typ:
-                union_switch_field = self.adjustments.field_attr(
-                    parent, field, "union_switch_field"
-                )
-                union_enum = self.adjustments.field_attr(parent, field, "union_enum")
-                if union_switch_field is None or union_enum is None:
-                    raise errors.MissingUnionOptions(
-                        parent=parent,
-                        field=field,
-                        have={"union_switch_field": union_switch_field, "union_enum": union_enum},
-                        need=["union_switch_field", "union_enum"],
-                    )
-
-                union.union_enum = union_enum
-                self.adjustments.used_union(union)
-                return ft.UnionType(
-                    union,
-                    multiples,
-                    switch_field=union_switch_field,
-                )
+            union.union_enum = union_enum
+            self.adjustments.used_union(union)
+            return ft.UnionType(
+                union,
+                multiples,
+                switch_field=union_switch_field,
+            )
 
         raise errors.NoSuchType(wanted=typ)
 
@@ -484,7 +679,7 @@ class Resolver:
         return self.adjustments.clones[typ]
 
     def get_struct(self, typ):
-        for struct in self.src.groups:
-            if struct.full_name == typ:
-                return struct
-        raise errors.UnknownStruct(wanted=typ)
+        struct = self.symbols.structs.get(typ)
+        if struct is None:
+            raise errors.UnknownStruct(wanted=typ)
+        return struct
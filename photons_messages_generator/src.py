@@ -47,34 +47,28 @@ class struct_field_spec(sb.Spec):
         return sf
 
 
-class StructField(dictobj.Spec):
-    name = dictobj.NullableField(sb.string_spec)
-    full_name = dictobj.NullableField(sb.string_spec)
-    type = dictobj.Field(sb.string_spec, wrapper=sb.required)
-    original_type = dictobj.Field(sb.string_spec, wrapper=sb.required)
-    size_bits = dictobj.Field(sb.integer_spec, wrapper=sb.optional_spec)
-    size_bytes = dictobj.Field(sb.integer_spec, wrapper=sb.optional_spec)
-    default = dictobj.NullableField(sb.string_spec)
-    extras = dictobj.Field(sb.listof(sb.string_spec()))
+class StructFieldBehaviour:
+    """Behaviour shared by the normalised StructField and the one from fast_src"""
 
     def format(self, in_fields=False, type_only=False):
-        extras = ".".join(self.format_extras())
-        if extras:
-            extras = f".{extras}"
-
-        if isinstance(self.type, ft.StructType):
-            if self.type.multiples == 1 and not self.original_type.startswith("["):
+        typ = self.type
+        if isinstance(typ, ft.StructType):
+            if typ.multiples == 1 and not self.original_type.startswith("["):
                 prefix = "" if in_fields else "fields."
-                return f"*{prefix}{self.type.struct.name}"
+                return f"*{prefix}{typ.struct.name}"
+
+        extras = ""
+        if self.default is not None or self.extras:
+            extras = ".".join(self.format_extras())
+            if extras:
+                extras = f".{extras}"
+
+        type_info = f"{typ.format(self.size_bits, in_fields=in_fields)}{extras}"
 
-        type_info = f"{self.type.format(self.size_bits, in_fields=in_fields)}{extras}"
         if type_only:
             return type_info
 
-        if isinstance(self.type, ft.StructType):
-            return f'("{self.name}", {type_info})'
-        else:
-            return f'("{self.name}", {type_info})'
+        return f'("{self.name}", {type_info})'
 
     def format_extras(self):
         if self.default is not None:
@@ -114,6 +108,17 @@ class StructField(dictobj.Spec):
         return clone
 
 
+class StructField(StructFieldBehaviour, dictobj.Spec):
+    name = dictobj.NullableField(sb.string_spec)
+    full_name = dictobj.NullableField(sb.string_spec)
+    type = dictobj.Field(sb.string_spec, wrapper=sb.required)
+    original_type = dictobj.Field(sb.string_spec, wrapper=sb.required)
+    size_bits = dictobj.Field(sb.integer_spec, wrapper=sb.optional_spec)
+    size_bytes = dictobj.Field(sb.integer_spec, wrapper=sb.optional_spec)
+    default = dictobj.NullableField(sb.string_spec)
+    extras = dictobj.Field(sb.listof(sb.string_spec()))
+
+
 class CloneStruct(dictobj.Spec):
     name = dictobj.Field(sb.string_spec, wrapper=sb.required)
     multi_options = dictobj.NullableField(sb.any_spec)
@@ -139,12 +144,8 @@ class struct_spec(sb.Spec):
         return Struct.FieldSpec().normalise(meta, val)
 
 
-class Struct(dictobj.Spec):
-    name = dictobj.Field(sb.string_spec, wrapper=sb.required)
-    full_name = dictobj.Field(sb.string_spec, wrapper=sb.required)
-    size_bytes = dictobj.Field(sb.integer_spec, wrapper=sb.required)
-    item_fields = dictobj.Field(sb.listof(struct_field_spec()))
-    multi_options = dictobj.NullableField(sb.any_spec)
+class StructBehaviour:
+    """Behaviour shared by the normalised Struct and the one from fast_src"""
 
     @property
     def multi_name(self):
@@ -162,6 +163,14 @@ class Struct(dictobj.Spec):
         return hash(self.full_name)
 
 
+class Struct(StructBehaviour, dictobj.Spec):
+    name = dictobj.Field(sb.string_spec, wrapper=sb.required)
+    full_name = dictobj.Field(sb.string_spec, wrapper=sb.required)
+    size_bytes = dictobj.Field(sb.integer_spec, wrapper=sb.required)
+    item_fields = dictobj.Field(sb.listof(struct_field_spec()))
+    multi_options = dictobj.NullableField(sb.any_spec)
+
+
 class packet_spec(sb.Spec):
     def normalise_filled(self, meta, val):
         val = sb.dictionary_spec().normalise(meta, val)
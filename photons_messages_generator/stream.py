@@ -0,0 +1,166 @@
+"""
+Normalising the src document as it is parsed.
+
+Loading the whole src document makes nested dictionaries for all of it before
+normalising makes the objects we resolve, so both are in memory at once.
+Here we read the yaml events instead and normalise each enum, struct, union
+and packet as soon as it has been read, letting go of what we parsed for it.
+
+Like fast_src we only understand the shape the src document normally has.
+Anchors, tags, duplicate keys or anything fast_src doesn't understand make us
+give up and return the whole document parsed the normal way, so it is
+normalised with the specs and gets exactly the errors it always has.
+"""
+from photons_messages_generator.fast_src import (
+    FastSrc,
+    Unexpected,
+    make_enum,
+    make_struct,
+    make_packet,
+    expect,
+)
+from photons_messages_generator.loader import make_yaml, load_yaml
+
+import logging
+import time
+
+log = logging.getLogger("generator.stream")
+
+# The tags of the scalars we know how to make
+plain_tags = {
+    f"tag:yaml.org,2002:{name}" for name in ("str", "int", "float", "bool", "null", "timestamp")
+}
+
+
+class Events:
+    """Turns yaml events into python values"""
+
+    def __init__(self, yaml, events):
+        self.events = events
+        self.resolver = yaml.resolver
+        self.constructor = yaml.constructor
+
+        # Most scalars are the same few type names and numbers
+        self.scalars = {}
+
+        from ruamel.yaml import events as e
+        from ruamel.yaml.nodes import ScalarNode
+
+        self.e = e
+        self.ScalarNode = ScalarNode
+
+    def next(self, *kinds):
+        event = next(self.events)
+        if kinds:
+            expect(isinstance(event, kinds))
+        if getattr(event, "anchor", None) is not None:
+            raise Unexpected()
+        return event
+
+    def scalar(self, event):
+        expect(event.tag is None)
+
+        key = (event.value, event.implicit[0])
+        if key not in self.scalars:
+            tag = self.resolver.resolve(self.ScalarNode, event.value, event.implicit)
+            expect(tag in plain_tags)
+            node = self.ScalarNode(tag, event.value)
+            self.scalars[key] = self.constructor.yaml_constructors[tag](self.constructor, node)
+        return self.scalars[key]
+
+    def value(self, event):
+        """Return the value that starts with this event"""
+        e = self.e
+        if isinstance(event, e.ScalarEvent):
+            return self.scalar(event)
+
+        expect(event.tag is None)
+
+        if isinstance(event, e.SequenceStartEvent):
+            found = []
+            while True:
+                event = self.next()
+                if isinstance(event, e.SequenceEndEvent):
+                    return found
+                found.append(self.value(event))
+
+        if isinstance(event, e.MappingStartEvent):
+            found = {}
+            for key, event in self.items():
+                found[key] = self.value(event)
+            return found
+
+        raise Unexpected()
+
+    def items(self):
+        """Yield (key, first event of the value) for the mapping we are in"""
+        e = self.e
+        seen = set()
+        while True:
+            event = self.next(e.ScalarEvent, e.MappingEndEvent)
+            if isinstance(event, e.MappingEndEvent):
+                return
+
+            key = self.scalar(event)
+            expect(type(key) is str and key not in seen)
+            seen.add(key)
+            yield key, self.next()
+
+
+def stream_normalise(yaml, content):
+    """Normalise the src document in content or raise Unexpected if we can't"""
+    events = Events(yaml, iter(yaml.parse(content)))
+    e = events.e
+
+    events.next(e.StreamStartEvent)
+    events.next(e.DocumentStartEvent)
+    events.next(e.MappingStartEvent)
+
+    found = {"enums": [], "unions": [], "groups": [], "packets": []}
+
+    for section, event in events.items():
+        if section not in ("enums", "unions", "groups", "fields", "packets"):
+            events.value(event)
+            continue
+
+        if section == "fields":
+            section = "groups"
+
+        # Only one of fields and groups may be there
+        expect(not found[section])
+        expect(isinstance(event, e.MappingStartEvent) and event.tag is None)
+
+        for name, event in events.items():
+            if section == "enums":
+                found["enums"].append(make_enum(name, events.value(event)))
+            elif section == "packets":
+                expect(isinstance(event, e.MappingStartEvent) and event.tag is None)
+                for packet_name, event in events.items():
+                    found["packets"].append(make_packet(name, packet_name, events.value(event)))
+            else:
+                found[section].append(make_struct(name, events.value(event)))
+
+    events.next(e.DocumentEndEvent)
+    events.next(e.StreamEndEvent)
+
+    return FastSrc(found["enums"], found["unions"], found["groups"], found["packets"])
+
+
+def stream_src(content, *, cache=None, name="src"):
+    """
+    Return the normalised src in content
+
+    If we can't normalise it as it's parsed then we return the document parsed
+    with load_yaml for the normal path to normalise.
+    """
+    from ruamel.yaml import YAMLError
+
+    start = time.perf_counter()
+    try:
+        src = stream_normalise(make_yaml(), content)
+    except (Unexpected, YAMLError):
+        log.info(f"Loading all of {name} because it couldn't be normalised as it was parsed")
+        return load_yaml(content, cache=cache, name=name)
+
+    log.info(f"Normalised {name} as it was parsed in {time.perf_counter() - start:.3f}s")
+    return src
@@ -34,47 +34,51 @@ def a_temp_dir():
 
 
 class Output:
-    def __init__(self, directory):
-        self.directory = directory
+    def __init__(self, rendered):
+        self.rendered = rendered
 
     def assertFileContents(self, path_parts, content):
         if isinstance(path_parts, str):
             path_parts = [path_parts]
 
-        filename = os.path.join(self.directory, *path_parts)
-        if not os.path.exists(filename):
+        filename = os.path.join(*path_parts)
+        if filename not in self.rendered:
             assert False, f"Expected {filename} to exist"
 
-        with open(filename) as fle:
-            lines = fle.readlines()
+        lines = self.rendered[filename].splitlines(keepends=True)
+        want = dedent(content).lstrip().splitlines(keepends=True)
 
-            with a_temp_file() as f:
-                f.write(dedent(content).lstrip())
-                f.flush()
-                with open(f.name, "r") as fr:
-                    want = fr.readlines()
-
-            if lines != want:
-                diff = "".join(
-                    difflib.unified_diff(lines, want, fromfile="generated", tofile="want")
-                )
-                assert False, f"Expected content to be the same\n{diff}"
+        if lines != want:
+            diff = "".join(difflib.unified_diff(lines, want, fromfile="generated", tofile="want"))
+            assert False, f"Expected content to be the same\n{diff}"
 
 
 @contextmanager
 def generate(src, adjustments):
-    with a_temp_dir() as directory:
-        src = YAML(typ="safe").load(src)
-        adjustments = YAML(typ="safe").load(adjustments) or {}
+    src = YAML(typ="safe").load(src)
+    adjustments = YAML(typ="safe").load(adjustments) or {}
+
+    if "output" not in adjustments:
+        adjustments["output"] = [
+            {"create": "enums", "dest": "enums.py"},
+            {"create": "fields", "dest": "fields.py"},
+            {"create": "packets", "dest": "messages.py", "options": {"include": "*"}},
+        ]
+
+    from photons_messages_generator.generate import generate_to_memory
+
+    yield Output(generate_to_memory(src, adjustments))
+
 
-        if "output" not in adjustments:
-            adjustments["output"] = [
-                {"create": "enums", "dest": "enums.py"},
-                {"create": "fields", "dest": "fields.py"},
-                {"create": "packets", "dest": "messages.py", "options": {"include": "*"}},
-            ]
+def value_and_pid(shared, value):
+    """For testing run_in_order, which needs functions that workers can import"""
+    return shared, value, os.getpid()
 
-        from photons_messages_generator.generate import generate
 
-        generate(src, adjustments, directory)
-        yield Output(directory)
+def record_and_fail(shared, value):
+    """For testing run_in_order, writes value to the shared folder and fails for 2"""
+    with open(os.path.join(shared, str(value)), "a") as fle:
+        fle.write(f"{os.getpid()}\n")
+    if value == 2:
+        raise ValueError(f"Failed on {value}")
+    return value
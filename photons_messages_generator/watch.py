@@ -0,0 +1,203 @@
+"""
+Watching the src and adjustments files so we can generate when they change.
+
+On Linux we use inotify through ctypes and otherwise we poll the files. We
+watch the folders the files are in rather than the files themselves because
+editors often save by writing a new file and renaming it over the old one.
+"""
+from collections import OrderedDict
+import ctypes.util
+import logging
+import select
+import struct
+import ctypes
+import pickle
+import time
+import os
+
+log = logging.getLogger("generator.watch")
+
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+
+inotify_event = struct.Struct("iIII")
+
+
+class MemoryDocuments:
+    """
+    Keeps the most recent parsed documents in memory
+
+    This has the same interface as loader.DocumentCache and is given to
+    load_yaml. The documents are stored pickled so that every get returns a
+    fresh copy that generating is free to change. Anything we don't have is
+    looked for in the fallback cache if there is one.
+    """
+
+    def __init__(self, fallback=None, keep=4):
+        self.keep = keep
+        self.fallback = fallback
+        self.documents = OrderedDict()
+
+    def get(self, key):
+        if key in self.documents:
+            self.documents.move_to_end(key)
+            return True, pickle.loads(self.documents[key])
+
+        if self.fallback is None:
+            return False, None
+
+        found, document = self.fallback.get(key)
+        if found:
+            self.remember(key, document)
+        return found, document
+
+    def set(self, key, document):
+        self.remember(key, document)
+        if self.fallback is not None:
+            self.fallback.set(key, document)
+
+    def remember(self, key, document):
+        self.documents[key] = pickle.dumps(document, pickle.HIGHEST_PROTOCOL)
+        self.documents.move_to_end(key)
+        while len(self.documents) > self.keep:
+            self.documents.popitem(last=False)
+
+
+class Watcher:
+    """
+    Base for watching files
+
+    Subclasses implement ``changed(timeout)`` which returns whether any of the
+    files changed within timeout seconds, or waits forever if timeout is None.
+    """
+
+    def __init__(self, paths):
+        self.paths = [os.path.abspath(path) for path in paths]
+
+    def wait(self, debounce):
+        """
+        Block until the files change
+
+        We then keep waiting until nothing has changed for debounce seconds
+        so that a burst of saves only causes one generate.
+        """
+        while not self.changed(None):
+            pass
+
+        while self.changed(debounce):
+            pass
+
+    def close(self):
+        pass
+
+
+class PollingWatcher(Watcher):
+    """Notices changes by looking at the modified time and size of each file"""
+
+    def __init__(self, paths, interval=0.5):
+        super().__init__(paths)
+        self.interval = interval
+        self.last = self.snapshot()
+
+    def snapshot(self):
+        found = []
+        for path in self.paths:
+            try:
+                stat = os.stat(path)
+            except OSError:
+                found.append(None)
+            else:
+                found.append((stat.st_mtime_ns, stat.st_size, stat.st_ino))
+        return found
+
+    def changed(self, timeout):
+        start = time.monotonic()
+        while True:
+            current = self.snapshot()
+            if current != self.last:
+                self.last = current
+                return True
+
+            if timeout is not None and time.monotonic() - start >= timeout:
+                return False
+
+            wait = self.interval
+            if timeout is not None:
+                wait = min(wait, max(0, timeout - (time.monotonic() - start)))
+            time.sleep(wait)
+
+
+class InotifyWatcher(Watcher):
+    """Uses inotify to be told when the files change"""
+
+    mask = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE | IN_DELETE
+
+    def __init__(self, paths, libc):
+        super().__init__(paths)
+        self.libc = libc
+
+        self.fd = libc.inotify_init1(os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+
+        self.names = {}
+        try:
+            for path in self.paths:
+                folder, name = os.path.split(path)
+                if folder not in self.names.values():
+                    wd = libc.inotify_add_watch(self.fd, os.fsencode(folder), self.mask)
+                    if wd < 0:
+                        raise OSError(ctypes.get_errno(), f"Failed to watch {folder}")
+                    self.names[wd] = folder
+        except Exception:
+            self.close()
+            raise
+
+    def read_events(self):
+        data = os.read(self.fd, 64 * 1024)
+        offset = 0
+        while offset < len(data):
+            wd, _, _, length = inotify_event.unpack_from(data, offset)
+            offset += inotify_event.size
+            name = data[offset : offset + length].rstrip(b"\0")
+            offset += length
+            yield os.path.join(self.names.get(wd, ""), os.fsdecode(name))
+
+    def changed(self, timeout):
+        start = time.monotonic()
+        while True:
+            remaining = None
+            if timeout is not None:
+                remaining = max(0, timeout - (time.monotonic() - start))
+
+            ready, _, _ = select.select([self.fd], [], [], remaining)
+            if not ready:
+                return False
+
+            if any(path in self.paths for path in self.read_events()):
+                return True
+
+    def close(self):
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+
+
+def make_watcher(paths):
+    """Return an InotifyWatcher if we can and otherwise a PollingWatcher"""
+    name = ctypes.util.find_library("c")
+    try:
+        libc = ctypes.CDLL(name, use_errno=True)
+        libc.inotify_init1
+    except (OSError, AttributeError):
+        log.info("Polling for changes because inotify isn't available")
+        return PollingWatcher(paths)
+
+    try:
+        return InotifyWatcher(paths, libc)
+    except OSError as error:
+        log.info(f"Polling for changes because inotify didn't work: {error}")
+        return PollingWatcher(paths)
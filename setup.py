@@ -14,6 +14,7 @@ setup(
       [ "delfick_project==0.7.9"
       , "rainbow_logging_handler==2.2.2"
       , "ruamel.yaml==0.17.21"
+      , "ruamel.yaml.clib==0.2.8; platform_python_implementation == 'CPython'"
       ]
 
     , extras_require =
@@ -0,0 +1,25 @@
+# coding: spec
+
+from photons_messages_generator.generate import generate_to_memory
+
+from benchmarks.synthetic import synthetic_protocol
+from benchmarks import run
+
+describe "Benchmarks":
+    it "has a synthetic protocol that generates":
+        src, adjustments = synthetic_protocol(50)
+        rendered = generate_to_memory(src, adjustments)
+        assert "class Bench0Messages(Messages):" in rendered["messages/bench0.py"]
+        assert "def union_fields_Union0(typ):" in rendered["fields.py"]
+        assert "class OptionalLeaf0(dictobj.PacketSpec):" in rendered["fields.py"]
+
+    it "times every phase":
+        result = run.run(20, repeat=1, jobs=1)
+        for name in ("load.src", "normalise.src", "resolve.resolve_types", "render.fields.py"):
+            assert name in result["phases"]
+
+    it "finds regressions against a baseline":
+        baseline = {"size": 1, "jobs": 1, "phases": {"a": 1.0, "b": 0.001}}
+        assert run.compare({"size": 1, "jobs": 1, "phases": {"a": 1.1, "b": 1}}, baseline, 0.25, 0.005)
+        assert not run.compare({"size": 1, "jobs": 1, "phases": {"a": 2, "b": 0}}, baseline, 0.25, 0.005)
+        assert not run.compare({"size": 2, "jobs": 1, "phases": {"a": 1}}, baseline, 0.25, 0.005)
@@ -268,3 +268,70 @@ describe "clones":
             """
 
             output.assertFileContents("fields.py", expected_fields)
+
+    it "names the fields of a clone like the fields of the original":
+        src = """
+            fields:
+              SomeParams:
+                size_bytes: 3
+                fields:
+                  - name: "FirstValue"
+                    type: "uint8"
+                    size_bytes: 1
+                  - type: "reserved"
+                    size_bytes: 1
+                  - name: "SecondValue"
+                    type: "uint8"
+                    size_bytes: 1
+
+            packets:
+              one:
+                OnePacketExample:
+                  pkt_type: 1
+                  size_bytes: 3
+                  fields:
+                    - name: "Params"
+                      type: "<SomeParams>"
+                      size_bytes: 3
+        """
+
+        adjustments = """
+        num_reserved_fields_in_frame: 3
+
+        clones:
+          some_params_optional:
+            cloning: SomeParams
+            fields:
+              SecondValue:
+                more_extras: ["optional()"]
+
+        changes:
+          some_params_optional:
+            reserved_start: 10
+
+          OnePacketExample:
+            fields:
+              Params:
+                override_struct: some_params_optional
+        """
+
+        with thp.generate(src, adjustments) as output:
+            expected_fields = """
+            # fmt: off
+
+            some_params_optional = [
+                  ("first_value", T.Uint8)
+                , ("reserved10", T.Reserved(8))
+                , ("second_value", T.Uint8.optional())
+                ]
+
+            some_params = [
+                  ("first_value", T.Uint8)
+                , ("reserved4", T.Reserved(8))
+                , ("second_value", T.Uint8)
+                ]
+
+            # fmt: on
+            """
+
+            output.assertFileContents("fields.py", expected_fields)
@@ -0,0 +1,170 @@
+# coding: spec
+
+from photons_messages_generator.daemon import Daemon, remove_stale_socket, request
+from photons_messages_generator import test_helpers as thp
+from photons_messages_generator import loader
+
+from delfick_project.errors_pytest import assertRaises
+from unittest import mock
+import threading
+import socket
+import json
+import pytest
+import time
+import os
+
+src = """
+packets:
+  one:
+    OnePacketExample:
+      pkt_type: 1
+      size_bytes: 1
+      fields:
+        - name: "One"
+          type: "uint8"
+          size_bytes: 1
+"""
+
+adjustments = """
+num_reserved_fields_in_frame: 3
+
+output:
+  - create: enums
+    dest: enums.py
+  - create: fields
+    dest: fields.py
+  - create: packets
+    dest: messages.py
+    options:
+      include: "*"
+"""
+
+
+@pytest.fixture()
+def folder():
+    with thp.a_temp_dir() as directory:
+        files = (
+            ("src.yml", src),
+            ("one.yml", adjustments),
+            ("two.yml", f"{adjustments}\nrename_namespaces:\n  one: two\n"),
+            ("bad.yml", f"{adjustments}\ninvalid_field_names: [one]\n"),
+        )
+        for name, content in files:
+            with open(os.path.join(directory, name), "w") as fle:
+                fle.write(content)
+        yield directory
+
+
+@pytest.fixture()
+def daemon(folder):
+    socket_path = os.path.join(folder, "daemon.sock")
+    daemon = Daemon(socket_path)
+    thread = threading.Thread(target=daemon.serve)
+    thread.start()
+
+    start = time.time()
+    while not os.path.exists(socket_path) and time.time() - start < 5:
+        time.sleep(0.01)
+
+    try:
+        yield daemon
+    finally:
+        if thread.is_alive():
+            request(socket_path, command="shutdown")
+        thread.join()
+
+
+def generate(folder, daemon, adjustments, output):
+    return request(
+        daemon.socket_path,
+        src=os.path.join(folder, "src.yml"),
+        adjustments=os.path.join(folder, adjustments),
+        output_folder=os.path.join(folder, output),
+    )
+
+
+def read(folder, *path):
+    with open(os.path.join(folder, *path)) as fle:
+        return fle.read()
+
+
+describe "Daemon":
+    it "generates each variant from one parse of the src", folder, daemon:
+        with mock.patch.object(loader, "make_yaml", wraps=loader.make_yaml) as make_yaml:
+            one = generate(folder, daemon, "one.yml", "out_one")
+            two = generate(folder, daemon, "two.yml", "out_two")
+            again = generate(folder, daemon, "one.yml", "out_one")
+
+        # src, one.yml and two.yml
+        assert make_yaml.call_count == 3
+
+        files = ["enums.py", "fields.py", "messages.py"]
+        assert one == {"ok": True, "files": {name: "written" for name in files}}
+        assert two == {"ok": True, "files": {name: "written" for name in files}}
+        assert again == {"ok": True, "files": {name: "unchanged" for name in files}}
+
+        assert "class OneMessages(Messages):" in read(folder, "out_one", "messages.py")
+        assert "class TwoMessages(Messages):" in read(folder, "out_two", "messages.py")
+
+    it "parses the src again when it changes", folder, daemon:
+        assert generate(folder, daemon, "one.yml", "out")["ok"]
+        with open(os.path.join(folder, "src.yml"), "w") as fle:
+            fle.write(src.replace("OnePacketExample", "OnePacketOther"))
+        assert generate(folder, daemon, "one.yml", "out")["ok"]
+        assert "PacketOther = msg(1" in read(folder, "out", "messages.py")
+
+    it "returns errors and keeps answering", folder, daemon:
+        response = generate(folder, daemon, "bad.yml", "out")
+        assert not response["ok"]
+        assert response["error_type"] == "InvalidName"
+        assert "Fields cannot be one of the invalid field names" in response["error"]
+
+        response = generate(folder, daemon, "missing.yml", "out")
+        assert response["error_type"] == "FileNotFoundError"
+
+        response = request(daemon.socket_path, command="dance")
+        assert response == {"ok": False, "error": "Unknown command dance", "error_type": "ValueError"}
+
+        assert generate(folder, daemon, "one.yml", "out")["ok"]
+
+    it "stops when asked to", folder, daemon:
+        assert request(daemon.socket_path, command="shutdown") == {"ok": True}
+        start = time.time()
+        while os.path.exists(daemon.socket_path) and time.time() - start < 5:
+            time.sleep(0.01)
+        assert not os.path.exists(daemon.socket_path)
+
+    it "won't replace the socket of a daemon that is listening", folder, daemon:
+        msg = f"Refusing to replace {daemon.socket_path} because a daemon is listening on it"
+        with assertRaises(Exception, msg):
+            Daemon(daemon.socket_path).serve()
+        assert generate(folder, daemon, "one.yml", "out")["ok"]
+
+    it "replaces a socket that nothing is listening on", folder:
+        socket_path = os.path.join(folder, "stale.sock")
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.bind(socket_path)
+
+        remove_stale_socket(socket_path)
+        assert not os.path.exists(socket_path)
+
+    it "complains about relative paths", folder, daemon:
+        line = json.dumps({"src": "src.yml", "adjustments": "one.yml", "output_folder": "out"})
+        assert daemon.respond(line) == {
+            "ok": False,
+            "error": "Paths must be absolute: src.yml, one.yml, out",
+            "error_type": "ValueError",
+        }
+
+    it "sends absolute paths from the client", folder, daemon:
+        cwd = os.getcwd()
+        try:
+            os.chdir(folder)
+            response = request(
+                daemon.socket_path, src="src.yml", adjustments="one.yml", output_folder="out"
+            )
+        finally:
+            os.chdir(cwd)
+
+        assert response["ok"]
+        assert "class OneMessages(Messages):" in read(folder, "out", "messages.py")
@@ -0,0 +1,369 @@
+# coding: spec
+
+from photons_messages_generator import test_helpers as thp
+from photons_messages_generator import executor, ir, loader, stream, watch
+from photons_messages_generator import generate as generate_module
+
+from unittest import mock
+import subprocess
+import pstats
+import pytest
+import json
+import sys
+import os
+
+src = """
+packets:
+  one:
+    OnePacketExample:
+      pkt_type: 1
+      size_bytes: 1
+      fields:
+        - name: "One"
+          type: "uint8"
+          size_bytes: 1
+"""
+
+adjustments = """
+num_reserved_fields_in_frame: 3
+
+output:
+  - create: enums
+    dest: enums.py
+  - create: fields
+    dest: fields.py
+  - create: packets
+    dest: messages.py
+    options:
+      include: "*"
+"""
+
+
+@pytest.fixture()
+def folder():
+    with thp.a_temp_dir() as directory:
+        for name, content in (("src.yml", src), ("adjustments.yml", adjustments)):
+            with open(os.path.join(directory, name), "w") as fle:
+                fle.write(content)
+        yield directory
+
+
+def run(folder, *extra):
+    executor.main(
+        [
+            "--src",
+            os.path.join(folder, "src.yml"),
+            "--adjustments",
+            os.path.join(folder, "adjustments.yml"),
+            "--output-folder",
+            os.path.join(folder, "output"),
+            "--cache-dir",
+            os.path.join(folder, "cache"),
+            *extra,
+        ]
+    )
+
+
+describe "Build cache":
+    it "does nothing when the inputs and outputs have not changed", folder:
+        run(folder)
+        assert os.path.exists(os.path.join(folder, "output", "messages.py"))
+
+        with mock.patch.object(generate_module, "generate") as generate:
+            run(folder)
+        generate.assert_not_called()
+
+    it "generates again when the adjustments change", folder:
+        run(folder)
+
+        with open(os.path.join(folder, "adjustments.yml"), "a") as fle:
+            fle.write("\ninvalid_field_names: [payload]\n")
+
+        with mock.patch.object(generate_module, "generate", return_value=None) as generate:
+            run(folder)
+        generate.assert_called_once()
+
+    it "generates again when an output file was changed", folder:
+        run(folder)
+
+        with open(os.path.join(folder, "output", "fields.py"), "a") as fle:
+            fle.write("# edited\n")
+
+        run(folder)
+        with open(os.path.join(folder, "output", "fields.py")) as fle:
+            assert "# edited" not in fle.read()
+
+    it "can be told to not use the cache", folder:
+        run(folder)
+
+        with mock.patch.object(generate_module, "generate", return_value=None) as generate:
+            run(folder, "--no-cache")
+        generate.assert_called_once()
+
+    it "generates again when asked to warn about duplicates", folder:
+        run(folder)
+
+        with mock.patch.object(generate_module, "generate") as generate:
+            run(folder, "--strict-duplicates")
+        generate.assert_called_once()
+        assert generate.call_args.kwargs["strict_duplicates"] is True
+
+describe "Document cache":
+    it "does not parse a src that has not changed", folder:
+        run(folder)
+
+        with open(os.path.join(folder, "adjustments.yml"), "a") as fle:
+            fle.write("\ninvalid_field_names: [payload]\n")
+
+        with mock.patch.object(loader, "make_yaml", wraps=loader.make_yaml) as make_yaml:
+            run(folder)
+
+        # Only the adjustments changed and needed parsing
+        assert make_yaml.call_count == 1
+        assert os.path.exists(os.path.join(folder, "output", "messages.py"))
+
+    it "parses everything when told to not use the cache", folder:
+        run(folder)
+
+        with mock.patch.object(loader, "make_yaml", wraps=loader.make_yaml) as make_yaml:
+            run(folder, "--no-cache")
+        assert make_yaml.call_count == 2
+
+describe "Writing output":
+    it "leaves files alone when their content has not changed", folder:
+        run(folder, "--no-cache")
+
+        location = os.path.join(folder, "output", "messages.py")
+        os.utime(location, ns=(1, 1))
+        run(folder, "--no-cache")
+        assert os.stat(location).st_mtime_ns == 1
+
+        with open(location, "a") as fle:
+            fle.write("# edited\n")
+        os.utime(location, ns=(1, 1))
+
+        run(folder, "--no-cache")
+        assert os.stat(location).st_mtime_ns != 1
+        with open(location) as fle:
+            assert "# edited" not in fle.read()
+        assert not [name for name in os.listdir(os.path.join(folder, "output")) if "tmp" in name]
+
+describe "Profiling":
+    it "writes phase timings and counts as json", folder:
+        profile_path = os.path.join(folder, "profile.json")
+        cprofile_path = os.path.join(folder, "resolve.prof")
+        run(folder, "--profile", profile_path, "--profile-resolve", cprofile_path)
+
+        with open(profile_path) as fle:
+            profile = json.load(fle)
+
+        names = [phase["name"] for phase in profile["phases"]]
+        for name in ("load.src", "normalise.src", "resolve", "resolve.resolve_types", "render"):
+            assert name in names
+
+        for phase in profile["phases"]:
+            assert phase["seconds"] >= 0
+
+        assert profile["counts"]["packets"] == 1
+        assert profile["counts"]["fields"] == 1
+        assert profile["counts"]["outputs"] == 3
+
+        assert pstats.Stats(cprofile_path).total_calls > 0
+
+    it "profiles even if nothing changed", folder:
+        run(folder)
+
+        profile_path = os.path.join(folder, "profile.json")
+        cprofile_path = os.path.join(folder, "resolve.prof")
+        run(folder, "--profile", profile_path, "--profile-resolve", cprofile_path)
+
+        with open(profile_path) as fle:
+            assert "resolve" in [phase["name"] for phase in json.load(fle)["phases"]]
+        assert pstats.Stats(cprofile_path).total_calls > 0
+
+describe "Streaming":
+    it "generates the same files from a streamed src", folder:
+        run(folder, "--no-cache")
+        with open(os.path.join(folder, "output", "messages.py")) as fle:
+            expected = fle.read()
+        os.remove(os.path.join(folder, "output", "messages.py"))
+
+        normalise = mock.patch.object(stream, "stream_normalise", wraps=stream.stream_normalise)
+        load_yaml = mock.patch.object(stream, "load_yaml", wraps=stream.load_yaml)
+        with normalise as stream_normalise, load_yaml as load_all:
+            run(folder, "--no-cache", "--stream")
+
+        stream_normalise.assert_called_once()
+        load_all.assert_not_called()
+        with open(os.path.join(folder, "output", "messages.py")) as fle:
+            assert fle.read() == expected
+
+describe "Dumping ir":
+    it "writes the resolved src as ir", folder:
+        ir_path = os.path.join(folder, "messages.ir")
+        run(folder, "--dump-ir", ir_path)
+
+        with open(ir_path, "rb") as fle:
+            found = ir.load_ir(fle.read())
+        assert [packet["name"] for packet in found["packets"]] == ["PacketExample"]
+
+        # The ir is written again even if nothing else changed
+        os.remove(ir_path)
+        run(folder, "--dump-ir", ir_path)
+        assert os.path.exists(ir_path)
+
+    it "replaces an old ir even if nothing else changed", folder:
+        ir_path = os.path.join(folder, "messages.ir")
+        run(folder)
+
+        with open(ir_path, "wb") as fle:
+            fle.write(b"from an older generator")
+        run(folder, "--dump-ir", ir_path)
+
+        with open(ir_path, "rb") as fle:
+            found = ir.load_ir(fle.read())
+        assert [packet["name"] for packet in found["packets"]] == ["PacketExample"]
+
+describe "Watching":
+    it "generates again when the files change and parses only what changed", folder:
+        adjustments_path = os.path.join(folder, "adjustments.yml")
+        messages_path = os.path.join(folder, "output", "messages.py")
+        waits = []
+
+        class Watcher:
+            def wait(self, debounce):
+                waits.append(debounce)
+                if len(waits) == 1:
+                    with open(messages_path) as fle:
+                        assert "OneMessages" in fle.read()
+                    with open(adjustments_path, "a") as fle:
+                        fle.write("\nrename_namespaces:\n  one: two\n")
+                else:
+                    raise KeyboardInterrupt()
+
+            def close(self):
+                pass
+
+        with mock.patch.object(watch, "make_watcher", return_value=Watcher()):
+            with mock.patch.object(loader, "make_yaml", wraps=loader.make_yaml) as make_yaml:
+                run(folder, "--no-cache", "--watch", "--watch-debounce", "0.5")
+
+        assert waits == [0.5, 0.5]
+        assert make_yaml.call_count == 3
+        with open(messages_path) as fle:
+            assert "TwoMessages" in fle.read()
+
+    it "keeps watching when generating fails", folder:
+        adjustments_path = os.path.join(folder, "adjustments.yml")
+        with open(adjustments_path, "a") as fle:
+            fle.write("\ninvalid_field_names: [one]\n")
+
+        waits = []
+
+        class Watcher:
+            def wait(self, debounce):
+                waits.append(debounce)
+                if len(waits) == 1:
+                    with open(adjustments_path, "w") as fle:
+                        fle.write(adjustments)
+                else:
+                    raise KeyboardInterrupt()
+
+            def close(self):
+                pass
+
+        with mock.patch.object(watch, "make_watcher", return_value=Watcher()):
+            run(folder, "--watch")
+
+        assert len(waits) == 2
+        assert os.path.exists(os.path.join(folder, "output", "messages.py"))
+
+describe "Variants":
+
+    @pytest.fixture()
+    def variants(self, folder):
+        location = os.path.join(folder, "variants")
+        os.makedirs(location)
+        for name, extra in (("one.yml", ""), ("two.yaml", "rename_namespaces:\n  one: two\n")):
+            with open(os.path.join(location, name), "w") as fle:
+                fle.write(f"{adjustments}\n{extra}")
+        with open(os.path.join(location, "README"), "w") as fle:
+            fle.write("not a variant")
+        return location
+
+    @pytest.mark.parametrize("jobs", ["1", "2"])
+    it "generates each variant into its own folder from one parse of the src", folder, variants, jobs:
+        with mock.patch.object(loader, "make_yaml", wraps=loader.make_yaml) as make_yaml:
+            run(folder, "--no-cache", "--variants", variants, "--jobs", jobs)
+        assert make_yaml.call_count == 3
+
+        for name, kls in (("one", "OneMessages"), ("two", "TwoMessages")):
+            with open(os.path.join(folder, "output", name, "messages.py")) as fle:
+                assert f"class {kls}(Messages):" in fle.read()
+        assert sorted(os.listdir(os.path.join(folder, "output"))) == ["one", "two"]
+
+    it "generates the variants that work and fails for the rest", folder, variants:
+        with open(os.path.join(variants, "bad.yml"), "w") as fle:
+            fle.write(f"{adjustments}\ninvalid_field_names: [one]\n")
+
+        with pytest.raises(SystemExit) as exit:
+            run(folder, "--variants", variants, "--jobs", "2")
+        assert str(exit.value) == "Failed to generate bad"
+
+        assert os.path.exists(os.path.join(folder, "output", "one", "messages.py"))
+        assert os.path.exists(os.path.join(folder, "output", "two", "messages.py"))
+
+describe "Startup":
+    # Modules that take most of the import time and aren't needed for --help
+    # or when the build cache says nothing changed
+    heavy = [
+        "ruamel.yaml",
+        "delfick_project.norms",
+        "photons_messages_generator.generate",
+        "photons_messages_generator.resolver",
+    ]
+
+    def imported(self, folder, *argv):
+        """Run the executor in a fresh python and return what it imported according to -X importtime"""
+        code = f"from photons_messages_generator.executor import main; main({list(argv)!r})"
+        result = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", code],
+            cwd=folder,
+            capture_output=True,
+            text=True,
+        )
+
+        modules = {}
+        for line in result.stderr.splitlines():
+            if line.startswith("import time:"):
+                _, cumulative, name = [part.strip() for part in line[12:].split("|")]
+                if cumulative.isdigit():
+                    modules[name] = int(cumulative)
+        return result, modules
+
+    it "doesn't import the generator for --help", folder:
+        result, modules = self.imported(folder, "--help")
+        assert result.returncode == 0, result.stderr
+        assert "--output-folder" in result.stdout
+        assert "photons_messages_generator.executor" in modules
+        assert [name for name in self.heavy if name in modules] == []
+
+    it "doesn't import the generator when nothing changed", folder:
+        argv = [
+            "--src",
+            "src.yml",
+            "--adjustments",
+            "adjustments.yml",
+            "--output-folder",
+            "output",
+            "--cache-dir",
+            "cache",
+        ]
+        result, modules = self.imported(folder, *argv)
+        assert result.returncode == 0, result.stderr
+        assert all(name in modules for name in self.heavy)
+
+        result, modules = self.imported(folder, *argv)
+        assert result.returncode == 0, result.stderr
+        assert "Nothing changed since the last generate" in result.stderr
+        assert [name for name in self.heavy if name in modules] == []
@@ -0,0 +1,112 @@
+# coding: spec
+
+from photons_messages_generator.helpers import camel_to_snake, snake_to_camel, write_if_changed
+from photons_messages_generator import test_helpers as thp
+
+import random
+import string
+import stat
+import os
+
+
+def reference_snake_to_camel(s):
+    """snake_to_camel as it was before it was made quicker"""
+    uppercase = False
+    final = []
+    for i, ch in enumerate(s):
+        if ch == "_":
+            uppercase = True
+            continue
+
+        if uppercase or i == 0:
+            ch = ch.upper()
+            uppercase = False
+
+        final.append(ch)
+    return "".join(final)
+
+
+def reference_camel_to_snake(s):
+    """camel_to_snake as it was before it was made quicker"""
+    parts = []
+    buf = []
+
+    for i, ch in enumerate(s):
+        if i == 0:
+            buf.append(ch.lower())
+            continue
+
+        if ch.isupper():
+            parts.append("".join(buf))
+            buf = []
+
+        buf.append(ch.lower())
+
+    if buf:
+        parts.append("".join(buf))
+
+    return "_".join(parts)
+
+
+# Include characters that change length or depend on context when their case changes
+alphabet = string.ascii_letters + string.digits + "___ \n" + "ßİΣσςÉéǅﬁ"
+
+
+def random_names(seed, amount=20000):
+    rand = random.Random(seed)
+    for _ in range(amount):
+        yield "".join(rand.choice(alphabet) for _ in range(rand.randint(0, 12)))
+
+
+describe "Name conversion":
+    it "converts names":
+        assert snake_to_camel("device_messages") == "DeviceMessages"
+        assert snake_to_camel("_a__b_") == "AB"
+        assert camel_to_snake("SetWaveformOptional") == "set_waveform_optional"
+        assert camel_to_snake("HSBK") == "h_s_b_k"
+        assert camel_to_snake("") == snake_to_camel("") == ""
+
+    it "matches the original implementations":
+        for name in random_names(seed=2020):
+            assert snake_to_camel(name) == reference_snake_to_camel(name), name
+            assert camel_to_snake(name) == reference_camel_to_snake(name), name
+
+            camel = reference_snake_to_camel(name)
+            assert camel_to_snake(camel) == reference_camel_to_snake(camel), camel
+
+describe "Writing files":
+    it "gives new files the mode open would give them":
+        umask = os.umask(0o022)
+        try:
+            with thp.a_temp_dir() as directory:
+                location = os.path.join(directory, "messages.py")
+                assert write_if_changed(location, "stuff")
+                assert stat.S_IMODE(os.stat(location).st_mode) == 0o644
+                assert os.listdir(directory) == ["messages.py"]
+        finally:
+            os.umask(umask)
+
+    it "doesn't change the umask to find the mode", monkeypatch:
+        def umask(mask):
+            assert False, "Changed the umask"
+
+        mask = os.umask(0)
+        os.umask(mask)
+
+        with thp.a_temp_dir() as directory:
+            location = os.path.join(directory, "messages.py")
+            monkeypatch.setattr(os, "umask", umask)
+            assert write_if_changed(location, "stuff")
+            assert stat.S_IMODE(os.stat(location).st_mode) == 0o666 & ~mask
+
+    it "keeps the mode of files that are written again":
+        with thp.a_temp_dir() as directory:
+            location = os.path.join(directory, "messages.py")
+            with open(location, "w") as fle:
+                fle.write("before")
+            os.chmod(location, 0o640)
+
+            assert write_if_changed(location, "after")
+            assert stat.S_IMODE(os.stat(location).st_mode) == 0o640
+            with open(location) as fle:
+                assert fle.read() == "after"
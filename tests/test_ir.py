@@ -0,0 +1,237 @@
+# coding: spec
+
+from photons_messages_generator.ir import encode, decode, dump_ir, load_ir, MAGIC
+from photons_messages_generator.generate import resolve
+from photons_messages_generator import errors
+
+from delfick_project.errors_pytest import assertRaises
+from ruamel.yaml import YAML
+import struct
+import pytest
+
+src = """
+enums:
+  SomeEnum:
+    type: uint8
+    values:
+      - name: "SOME_ENUM_ONE"
+        value: 1
+      - name: "SOME_ENUM_TWO"
+        value: 2
+
+fields:
+  Colour:
+    size_bytes: 2
+    fields:
+      - name: "Hue"
+        type: "uint16"
+        size_bytes: 2
+
+unions:
+  SomeUnion:
+    size_bytes: 2
+    fields:
+      - name: "Number"
+        type: "int16"
+        size_bytes: 2
+
+packets:
+  one:
+    OneSetThing:
+      pkt_type: 1
+      size_bytes: 7
+      fields:
+        - name: "Kind"
+          type: "<SomeEnum>"
+          size_bytes: 1
+        - name: "Value"
+          type: "<SomeUnion>"
+          size_bytes: 2
+        - name: "Colours"
+          type: "[2]<Colour>"
+          size_bytes: 4
+    OneStateThing:
+      pkt_type: 2
+      size_bytes: 7
+      fields:
+        - name: "Kind"
+          type: "<SomeEnum>"
+          size_bytes: 1
+        - name: "Value"
+          type: "<SomeUnion>"
+          size_bytes: 2
+        - name: "Colours"
+          type: "[2]<Colour>"
+          size_bytes: 4
+"""
+
+adjustments = """
+num_reserved_fields_in_frame: 3
+
+changes:
+  SomeEnum:
+    rename: Kind
+
+  Colour:
+    multi_options:
+      name: Colours
+      cache_amount: 10
+
+  OneSetThing:
+    fields:
+      Kind:
+        default: "SOME_ENUM_TWO"
+        extras: ["optional()"]
+      Value:
+        union_enum: Kind
+        union_switch_field: kind
+
+  OneStateThing:
+    using: OneSetThing
+"""
+
+
+describe "Binary ir":
+    @pytest.mark.parametrize(
+        "value",
+        [
+            None,
+            True,
+            False,
+            0,
+            -1,
+            2**70,
+            -(2**70),
+            1.5,
+            "",
+            "ünïcode",
+            [],
+            {},
+            [1, "two", [None, {"three": 3.0}]],
+            {"a": {"b": ["a", "b", "a"]}, "c": [True, False]},
+        ],
+    )
+    it "can read back what it wrote", value:
+        assert decode(encode(value)) == value
+
+    it "only writes each string once":
+        data = encode(["something long"] * 10)
+        assert data.count(b"something long") == 1
+
+    it "complains about data that isn't ir":
+        with assertRaises(errors.BadIR, "Too short to be an ir file"):
+            decode(b"PMG")
+
+        with assertRaises(errors.BadIR, "Not an ir file"):
+            decode(b"nope" * 4)
+
+        with assertRaises(errors.BadIR, "Unsupported ir format", got=999):
+            decode(struct.pack("<6sH", MAGIC, 999) + encode(None)[8:])
+
+        with assertRaises(errors.BadIR, "Ir file is corrupt"):
+            decode(encode(["one", "two"])[:-1])
+
+        with assertRaises(errors.BadIR, "Found more after the ir", extra=1):
+            decode(encode(None) + b"\0")
+
+    it "describes the resolved src":
+        resolved, resolved_adjustments = resolve(
+            YAML(typ="safe").load(src), YAML(typ="safe").load(adjustments)
+        )
+        found = load_ir(dump_ir(resolved, resolved_adjustments))
+
+        assert found["enums"] == [
+            {"name": "Kind", "type": "uint8", "values": [["ONE", 1], ["TWO", 2]]}
+        ]
+
+        colour = {
+            "name": "hue",
+            "type": {"kind": "simple", "type": "uint16", "multiples": 1},
+            "inline": False,
+            "size_bits": 16,
+            "default": None,
+            "extras": [],
+        }
+        assert found["structs"] == [
+            {
+                "name": "colour",
+                "size_bytes": 2,
+                "ignored": False,
+                "multi_name": "Colours",
+                "multi_cache_amount": 10,
+                "fields": [colour],
+            }
+        ]
+
+        assert found["unions"][0]["name"] == "SomeUnion"
+        assert found["unions"][0]["union_enum"] == "Kind"
+
+        set_thing, state_thing = found["packets"]
+        assert set_thing["name"] == "SetThing"
+        assert set_thing["namespace"] == "one"
+        assert set_thing["pkt_type"] == 1
+        assert set_thing["using"] is None
+        assert state_thing["using"] == "SetThing"
+
+        assert set_thing["fields"] == [
+            {
+                "name": "kind",
+                "type": {"kind": "enum", "enum": "Kind", "allow_unknown": False, "multiples": 1},
+                "inline": False,
+                "size_bits": 8,
+                "default": "SOME_ENUM_TWO",
+                "extras": ["optional()"],
+            },
+            {
+                "name": "value",
+                "type": {"kind": "union", "union": "SomeUnion", "switch_field": "kind"},
+                "inline": False,
+                "size_bits": 16,
+                "default": None,
+                "extras": [],
+            },
+            {
+                "name": "colours",
+                "type": {"kind": "struct", "struct": "colour", "multiples": 2, "ignored": False},
+                "inline": False,
+                "size_bits": 32,
+                "default": None,
+                "extras": [],
+            },
+        ]
+
+    it "gives the fields made from bits their width":
+        flags = """
+        fields:
+          Flags:
+            size_bytes: 1
+            fields:
+              - name: "Options"
+                type: "uint8"
+                size_bytes: 1
+        """
+
+        flag_adjustments = """
+        num_reserved_fields_in_frame: 3
+
+        changes:
+          Flags:
+            fields:
+              Options:
+                bits: [One, Two, Three, Four, Five, Six, Seven, Eight]
+        """
+
+        resolved, resolved_adjustments = resolve(
+            YAML(typ="safe").load(flags), YAML(typ="safe").load(flag_adjustments)
+        )
+        fields = load_ir(dump_ir(resolved, resolved_adjustments))["structs"][0]["fields"]
+        assert [(field["name"], field["size_bits"]) for field in fields] == [
+            ("one", 1),
+            ("two", 1),
+            ("three", 1),
+            ("four", 1),
+            ("five", 1),
+            ("six", 1),
+            ("seven", 1),
+            ("eight", 1),
+        ]
@@ -0,0 +1,769 @@
+# coding: spec
+
+from photons_messages_generator import test_helpers as thp
+from photons_messages_generator import errors
+
+from delfick_project.errors_pytest import assertRaises
+
+describe "Layouts":
+    it "writes the offsets and widths of every struct and packet":
+        src = """
+            enums:
+              SomeEnum:
+                type: uint8
+                values:
+                  - name: "SOME_ENUM_ONE"
+                    value: 1
+
+            fields:
+              Colour:
+                size_bytes: 3
+                fields:
+                  - name: "Hue"
+                    type: "uint16"
+                    size_bytes: 2
+                  - name: "Kind"
+                    type: "<SomeEnum>"
+                    size_bytes: 1
+
+              Flags:
+                size_bytes: 1
+                fields:
+                  - name: "Options"
+                    type: "uint8"
+                    size_bytes: 1
+
+            packets:
+              one:
+                OneSetThing:
+                  pkt_type: 2
+                  size_bytes: 11
+                  fields:
+                    - name: "Colour"
+                      type: "<Colour>"
+                      size_bytes: 3
+                    - type: "reserved"
+                      size_bytes: 1
+                    - name: "Colours"
+                      type: "[2]<Colour>"
+                      size_bytes: 6
+                    - name: "Flags"
+                      type: "<Flags>"
+                      size_bytes: 1
+                OneGetThing:
+                  pkt_type: 1
+                  size_bytes: 0
+                  fields: []
+        """
+
+        adjustments = """
+            num_reserved_fields_in_frame: 3
+
+            changes:
+              Colour:
+                multi_options:
+                  name: Colours
+
+              Flags:
+                fields:
+                  Options:
+                    bits:
+                      - Power
+                      - Reserved1
+                      - Reserved2
+                      - Reserved3
+                      - Reserved4
+                      - Reserved5
+                      - Reserved6
+                      - Reserved7
+
+            output:
+              - create: enums
+                dest: enums.py
+              - create: fields
+                dest: fields.py
+              - create: packets
+                dest: messages.py
+                options:
+                  include: "*"
+              - create: layouts
+                dest: layouts.py
+                static: |
+                  # Offsets and widths are in bits
+        """
+
+        with thp.generate(src, adjustments) as output:
+            expected = """
+            # Offsets and widths are in bits
+
+            # fmt: off
+
+            structs = {
+                "colour": (3, (
+                    ("hue", 0, 16),
+                    ("kind", 16, 8),
+                  )),
+                "flags": (1, (
+                    ("power", 0, 1),
+                    ("reserved1", 1, 1),
+                    ("reserved2", 2, 1),
+                    ("reserved3", 3, 1),
+                    ("reserved4", 4, 1),
+                    ("reserved5", 5, 1),
+                    ("reserved6", 6, 1),
+                    ("reserved7", 7, 1),
+                  )),
+            }
+
+            messages = {
+                "OneMessages": {
+                    "GetThing": (0, ()),
+                    "SetThing": (11, (
+                        ("hue", 0, 16),
+                        ("kind", 16, 8),
+                        ("reserved4", 24, 8),
+                        ("colours", 32, 48),
+                        ("power", 80, 1),
+                        ("reserved1", 81, 1),
+                        ("reserved2", 82, 1),
+                        ("reserved3", 83, 1),
+                        ("reserved4", 84, 1),
+                        ("reserved5", 85, 1),
+                        ("reserved6", 86, 1),
+                        ("reserved7", 87, 1),
+                      )),
+                },
+            }
+
+            # fmt: on
+            """
+
+            output.assertFileContents("layouts.py", expected)
+
+    it "gives a list of bits the width of all of them":
+        src = """
+            packets:
+              one:
+                OneSetFlags:
+                  pkt_type: 1
+                  size_bytes: 1
+                  fields:
+                    - name: "Flags"
+                      type: "[2]bit"
+                      size_bits: 2
+                    - type: "reserved"
+                      size_bits: 6
+        """
+
+        adjustments = """
+            num_reserved_fields_in_frame: 3
+
+            output:
+              - create: enums
+                dest: enums.py
+              - create: fields
+                dest: fields.py
+              - create: packets
+                dest: messages.py
+                options:
+                  include: "*"
+              - create: layouts
+                dest: layouts.py
+        """
+
+        with thp.generate(src, adjustments) as output:
+            expected = """
+            # fmt: off
+
+            structs = {
+            }
+
+            messages = {
+                "OneMessages": {
+                    "SetFlags": (1, (
+                        ("flags", 0, 2),
+                        ("reserved4", 2, 6),
+                      )),
+                },
+            }
+
+            # fmt: on
+            """
+
+            output.assertFileContents("layouts.py", expected)
+
+    it "can lay out fields that use a clone":
+        src = """
+            fields:
+              Colour:
+                size_bytes: 4
+                fields:
+                  - name: "Hue"
+                    type: "uint16"
+                    size_bytes: 2
+                  - name: "Saturation"
+                    type: "uint16"
+                    size_bytes: 2
+
+            packets:
+              one:
+                OneSetColour:
+                  pkt_type: 1
+                  size_bytes: 5
+                  fields:
+                    - name: "Colour"
+                      type: "<Colour>"
+                      size_bytes: 4
+                    - name: "Duration"
+                      type: "uint8"
+                      size_bytes: 1
+        """
+
+        adjustments = """
+            num_reserved_fields_in_frame: 3
+
+            clones:
+              colour_optionals:
+                cloning: Colour
+                fields:
+                  Hue:
+                    more_extras: ["optional()"]
+
+            changes:
+              OneSetColour:
+                fields:
+                  Colour:
+                    override_struct: colour_optionals
+
+            output:
+              - create: enums
+                dest: enums.py
+              - create: fields
+                dest: fields.py
+              - create: packets
+                dest: messages.py
+                options:
+                  include: "*"
+              - create: layouts
+                dest: layouts.py
+        """
+
+        with thp.generate(src, adjustments) as output:
+            expected = """
+            # fmt: off
+
+            structs = {
+                "colour_optionals": (4, (
+                    ("hue", 0, 16),
+                    ("saturation", 16, 16),
+                  )),
+                "colour": (4, (
+                    ("hue", 0, 16),
+                    ("saturation", 16, 16),
+                  )),
+            }
+
+            messages = {
+                "OneMessages": {
+                    "SetColour": (5, (
+                        ("hue", 0, 16),
+                        ("saturation", 16, 16),
+                        ("duration", 32, 8),
+                      )),
+                },
+            }
+
+            # fmt: on
+            """
+
+            output.assertFileContents("layouts.py", expected)
+
+    it "writes struct formats for the packets that are whole bytes":
+        src = """
+            enums:
+              SomeEnum:
+                type: uint16
+                values:
+                  - name: "SOME_ENUM_ONE"
+                    value: 1
+
+            fields:
+              Colour:
+                size_bytes: 4
+                fields:
+                  - name: "Hue"
+                    type: "uint16"
+                    size_bytes: 2
+                  - name: "Kind"
+                    type: "<SomeEnum>"
+                    size_bytes: 2
+
+            unions:
+              SomeUnion:
+                size_bytes: 2
+                fields:
+                  - name: "Number"
+                    type: "uint16"
+                    size_bytes: 2
+
+            packets:
+              one:
+                OneGetThing:
+                  pkt_type: 1
+                  size_bytes: 0
+                  fields: []
+                OneStateThing:
+                  pkt_type: 2
+                  size_bytes: 28
+                  fields:
+                    - name: "Colour"
+                      type: "<Colour>"
+                      size_bytes: 4
+                    - type: "reserved"
+                      size_bytes: 2
+                    - name: "Label"
+                      type: "[8]byte"
+                      size_bytes: 8
+                    - name: "Levels"
+                      type: "[2]float32"
+                      size_bytes: 8
+                    - name: "Duration"
+                      type: "uint32"
+                      size_bytes: 4
+                    - name: "On"
+                      type: "bool"
+                      size_bytes: 1
+                    - name: "Offset"
+                      type: "int8"
+                      size_bytes: 1
+                OneSetFlag:
+                  pkt_type: 3
+                  size_bytes: 1
+                  fields:
+                    - name: "Flag"
+                      type: "bit"
+                      size_bits: 1
+                    - type: "reserved"
+                      size_bits: 7
+                OneSetThing:
+                  pkt_type: 4
+                  size_bytes: 4
+                  fields:
+                    - name: "Kind"
+                      type: "uint16"
+                      size_bytes: 2
+                    - name: "Value"
+                      type: "<SomeUnion>"
+                      size_bytes: 2
+                OneSetOptions:
+                  pkt_type: 5
+                  size_bytes: 1
+                  fields:
+                    - name: "Options"
+                      type: "uint8"
+                      size_bytes: 1
+        """
+
+        adjustments = """
+            num_reserved_fields_in_frame: 3
+
+            changes:
+              OneStateThing:
+                fields:
+                  Label:
+                    string_type: true
+
+              OneSetOptions:
+                fields:
+                  Options:
+                    bits:
+                      - Power
+                      - Reserved1
+                      - Reserved2
+                      - Reserved3
+                      - Reserved4
+                      - Reserved5
+                      - Reserved6
+                      - Reserved7
+
+              OneSetThing:
+                fields:
+                  Value:
+                    union_enum: SomeEnum
+                    union_switch_field: kind
+
+            output:
+              - create: enums
+                dest: enums.py
+              - create: fields
+                dest: fields.py
+              - create: packets
+                dest: messages.py
+                options:
+                  include: "*"
+              - create: struct_formats
+                dest: formats.py
+        """
+
+        with thp.generate(src, adjustments) as output:
+            expected = """
+            import struct
+
+            # fmt: off
+
+            formats = {
+                "OneMessages": {
+                    "GetThing": struct.Struct("<"),
+                    "StateThing": struct.Struct("<HH2x8s2fI?b"),
+                },
+            }
+
+            unsupported = {
+                "OneMessages": {
+                    "SetFlag": "flag is part of a byte",
+                    "SetThing": "value is a union",
+                    "SetOptions": "power is part of a byte",
+                },
+            }
+
+            # fmt: on
+            """
+
+            output.assertFileContents("formats.py", expected)
+
+describe "Dispatch":
+    src = """
+        packets:
+          two:
+            TwoGetThing:
+              pkt_type: 4
+              size_bytes: 0
+              fields: []
+          one:
+            OneStateThing:
+              pkt_type: 2
+              size_bytes: 2
+              fields:
+                - name: "Value"
+                  type: "uint16"
+                  size_bytes: 2
+            OneGetThing:
+              pkt_type: 1
+              size_bytes: 0
+              fields: []
+    """
+
+    def adjustments(self, options):
+        return f"""
+            num_reserved_fields_in_frame: 3
+
+            namespace_order: ["one"]
+
+            output:
+              - create: enums
+                dest: enums.py
+              - create: fields
+                dest: fields.py
+              - create: packets
+                dest: messages.py
+                options:
+                  include: "*"
+              - create: dispatch
+                dest: dispatch.py
+                options: {options}
+        """
+
+    it "writes the messages by pkt_type":
+        with thp.generate(self.src, self.adjustments("{}")) as output:
+            expected = """
+            # fmt: off
+
+            by_pkt_type = {
+                1: ("OneMessages", "GetThing", 0),
+                2: ("OneMessages", "StateThing", 2),
+                4: ("TwoMessages", "GetThing", 0),
+            }
+
+            # fmt: on
+            """
+
+            output.assertFileContents("dispatch.py", expected)
+
+    it "can also write a list indexed by pkt_type":
+        with thp.generate(self.src, self.adjustments("{array: true}")) as output:
+            expected = """
+            # fmt: off
+
+            by_pkt_type = {
+                1: ("OneMessages", "GetThing", 0),
+                2: ("OneMessages", "StateThing", 2),
+                4: ("TwoMessages", "GetThing", 0),
+            }
+
+            by_index = [
+                None,
+                ("OneMessages", "GetThing", 0),
+                ("OneMessages", "StateThing", 2),
+                None,
+                ("TwoMessages", "GetThing", 0),
+            ]
+
+            # fmt: on
+            """
+
+            output.assertFileContents("dispatch.py", expected)
+
+    it "only has the namespaces that packets outputs write":
+        adjustments = """
+            num_reserved_fields_in_frame: 3
+
+            output:
+              - create: enums
+                dest: enums.py
+              - create: fields
+                dest: fields.py
+              - create: packets
+                dest: messages.py
+                options:
+                  include: "*"
+                  exclude: "two"
+              - create: dispatch
+                dest: dispatch.py
+        """
+
+        with thp.generate(self.src, adjustments) as output:
+            expected = """
+            # fmt: off
+
+            by_pkt_type = {
+                1: ("OneMessages", "GetThing", 0),
+                2: ("OneMessages", "StateThing", 2),
+            }
+
+            # fmt: on
+            """
+
+            output.assertFileContents("dispatch.py", expected)
+
+    it "complains about duplicate pkt_types":
+        src = self.src.replace("pkt_type: 4", "pkt_type: 2")
+        kwargs = {
+            "pkt_type": 2,
+            "first": ("OneMessages", "StateThing"),
+            "second": ("TwoMessages", "GetThing"),
+        }
+        msg = "Can't make a dispatch table with duplicate pkt_types"
+        with assertRaises(errors.InvalidOutput, msg, **kwargs):
+            with thp.generate(src, self.adjustments("{}")):
+                pass
+
+describe "Sizes":
+    strict = """
+        num_reserved_fields_in_frame: 3
+        strict_sizes: true
+    """
+
+    it "complains if the fields of a packet don't add up to size_bytes":
+        src = """
+            packets:
+              one:
+                OneSetThing:
+                  pkt_type: 1
+                  size_bytes: 3
+                  fields:
+                    - name: "Value"
+                      type: "uint16"
+                      size_bytes: 2
+        """
+
+        msg = "Fields add up to 16 bits rather than 3 bytes"
+        with assertRaises(errors.WrongSizeBytes, msg, packet="OneSetThing"):
+            with thp.generate(src, self.strict):
+                pass
+
+    it "only warns about the size by default", caplog:
+        src = """
+            packets:
+              one:
+                OneSetThing:
+                  pkt_type: 1
+                  size_bytes: 3
+                  fields:
+                    - name: "Value"
+                      type: "uint16"
+                      size_bytes: 2
+        """
+
+        with thp.generate(src, "num_reserved_fields_in_frame: 3"):
+            pass
+
+        found = [r.getMessage() for r in caplog.records if r.levelname == "WARNING"]
+        assert len(found) == 1
+        assert "Fields add up to 16 bits rather than 3 bytes" in found[0]
+        assert "OneSetThing" in found[0]
+
+    it "complains if the fields of a struct don't add up to size_bytes":
+        src = """
+            fields:
+              Colour:
+                size_bytes: 4
+                fields:
+                  - name: "Hue"
+                    type: "uint16"
+                    size_bytes: 2
+
+            packets:
+              one:
+                OneSetColour:
+                  pkt_type: 1
+                  size_bytes: 2
+                  fields:
+                    - name: "Colour"
+                      type: "<Colour>"
+                      size_bytes: 2
+        """
+
+        msg = "Fields add up to 16 bits rather than 4 bytes"
+        with assertRaises(errors.WrongSizeBytes, msg, struct="Colour"):
+            with thp.generate(src, self.strict):
+                pass
+
+    it "counts bits, lists and the fields of splatted structs":
+        src = """
+            fields:
+              Colour:
+                size_bytes: 4
+                fields:
+                  - name: "Hue"
+                    type: "uint16"
+                    size_bytes: 2
+                  - name: "Saturation"
+                    type: "uint16"
+                    size_bytes: 2
+
+            packets:
+              one:
+                OneSetColours:
+                  pkt_type: 1
+                  size_bytes: 15
+                  fields:
+                    - name: "Colour"
+                      type: "<Colour>"
+                      size_bytes: 4
+                    - name: "Colours"
+                      type: "[2]<Colour>"
+                      size_bytes: 8
+                    - name: "Flags"
+                      type: "[2]bit"
+                      size_bits: 2
+                    - type: "reserved"
+                      size_bits: 6
+                    - name: "Mask"
+                      type: "uint8"
+                      size_bytes: 1
+                    - name: "Extra"
+                      type: "uint8"
+                      size_bytes: 1
+        """
+
+        adjustments = """
+            num_reserved_fields_in_frame: 3
+            strict_sizes: true
+
+            changes:
+              Colour:
+                multi_options:
+                  name: "Colour"
+
+              OneSetColours:
+                fields:
+                  Mask:
+                    bits:
+                      - A
+                      - B
+                      - C
+                      - D
+                      - E
+                      - F
+                      - G
+                      - H
+        """
+
+        with thp.generate(src, adjustments):
+            pass
+
+    it "can write the size_bytes of each packet":
+        src = """
+            packets:
+              two:
+                TwoGetThing:
+                  pkt_type: 4
+                  size_bytes: 0
+                  fields: []
+              one:
+                OneStateThing:
+                  pkt_type: 2
+                  size_bytes: 2
+                  fields:
+                    - name: "Value"
+                      type: "uint16"
+                      size_bytes: 2
+                OneGetThing:
+                  pkt_type: 1
+                  size_bytes: 0
+                  fields: []
+        """
+
+        adjustments = """
+            num_reserved_fields_in_frame: 3
+
+            output:
+              - create: enums
+                dest: enums.py
+              - create: fields
+                dest: fields.py
+              - create: packets
+                dest: messages.py
+                options:
+                  include: "*"
+                  size_bytes: true
+        """
+
+        with thp.generate(src, adjustments) as output:
+            expected = """
+            # fmt: off
+
+            ########################
+            ###   TWO
+            ########################
+
+            class TwoMessages(Messages):
+                GetThing = msg(4)
+
+            ########################
+            ###   ONE
+            ########################
+
+            class OneMessages(Messages):
+                GetThing = msg(1)
+
+                StateThing = msg(2
+                    , ("value", T.Uint16)
+                    )
+
+            size_bytes = {
+                "TwoMessages": {
+                    "GetThing": 0,
+                },
+                "OneMessages": {
+                    "GetThing": 0,
+                    "StateThing": 2,
+                },
+            }
+
+            # fmt: on
+
+            __all__ = ["TwoMessages", "OneMessages"]
+            """
+
+            output.assertFileContents("messages.py", expected)
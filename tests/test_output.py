@@ -1,6 +1,19 @@
 # coding: spec
 
+from photons_messages_generator.generate import generate_to_memory
 from photons_messages_generator import test_helpers as thp
+from photons_messages_generator.profiling import Profile
+from photons_messages_generator import generate, errors
+
+from delfick_project.errors_pytest import assertRaises
+from ruamel.yaml import YAML
+import os
+
+
+def use_jobs(monkeypatch):
+    """Make render use its jobs however few outputs and cpus there are"""
+    monkeypatch.setattr(generate, "min_outputs_for_jobs", 1)
+    monkeypatch.setattr(os, "cpu_count", lambda: 4)
 
 describe "Output":
     it "can generate static at the top of the file and split packets":
@@ -147,3 +160,112 @@ describe "Output":
             output.assertFileContents("fields_output.py", expected_fields)
             output.assertFileContents("messages/one.py", expected_one)
             output.assertFileContents("messages/two.py", expected_two)
+
+    it "renders the same output with multiple jobs", monkeypatch:
+        use_jobs(monkeypatch)
+
+        src = """
+            enums:
+              SomeEnum:
+                type: uint8
+                values:
+                  - name: "SOME_ENUM_ONE"
+                    value: 1
+
+            packets:
+              one:
+                OnePacketExample:
+                  pkt_type: 1
+                  size_bytes: 1
+                  fields:
+                    - name: "One"
+                      type: "<SomeEnum>"
+                      size_bytes: 1
+
+              two:
+                TwoPacketThing:
+                  pkt_type: 2
+                  size_bytes: 1
+                  fields:
+                    - name: "One"
+                      type: "uint8"
+                      size_bytes: 1
+        """
+
+        adjustments = """
+        num_reserved_fields_in_frame: 3
+
+        output:
+         - create: enums
+           dest: enums.py
+         - create: fields
+           dest: fields.py
+         - create: packets
+           dest: messages/one.py
+           options:
+             include: "one"
+         - create: packets
+           dest: messages/two.py
+           options:
+             include: "two"
+        """
+
+        def generate_with(jobs, profile):
+            return generate_to_memory(
+                YAML(typ="safe").load(src),
+                YAML(typ="safe").load(adjustments),
+                jobs=jobs,
+                profile=profile,
+            )
+
+        def render_phases(profile):
+            return [p["name"] for p in profile.phases if p["name"].startswith("render.")]
+
+        serial_profile = Profile()
+        serial = generate_with(1, serial_profile)
+        assert list(serial) == ["enums.py", "fields.py", "messages/one.py", "messages/two.py"]
+
+        parallel_profile = Profile()
+        assert generate_with(4, parallel_profile) == serial
+
+        phases = ["render.enums.py", "render.fields.py", "render.messages/one.py"]
+        phases.append("render.messages/two.py")
+        assert render_phases(serial_profile) == phases
+        assert render_phases(parallel_profile) == phases
+
+    it "raises the same error when rendering with multiple jobs", monkeypatch:
+        use_jobs(monkeypatch)
+
+        src = """
+            packets:
+              one:
+                OnePacketExample:
+                  pkt_type: 1
+                  size_bytes: 2
+                  fields:
+                    - name: "Failure"
+                      type: "[10]byte"
+                      size_bits: 10
+                    - type: "reserved"
+                      size_bits: 6
+        """
+
+        adjustments = """
+        num_reserved_fields_in_frame: 3
+
+        output:
+         - create: enums
+           dest: enums.py
+         - create: fields
+           dest: fields.py
+         - create: packets
+           dest: messages.py
+           options:
+             include: "*"
+        """
+
+        msg = "Only basic types and reserved may be a partial byte"
+        with assertRaises(errors.BadSizeBytes, msg, name="byte"):
+            generate_to_memory(
+                YAML(typ="safe").load(src), YAML(typ="safe").load(adjustments), jobs=3
+            )
@@ -0,0 +1,35 @@
+# coding: spec
+
+from photons_messages_generator.test_helpers import value_and_pid, record_and_fail
+from photons_messages_generator.parallel import run_in_order
+from photons_messages_generator import test_helpers as thp
+
+from delfick_project.errors_pytest import assertRaises
+import os
+
+describe "run_in_order":
+    it "calls the function in this process with one job":
+        results = run_in_order(value_and_pid, [(1,), (2,), (3,)], jobs=1, shared="s")
+        assert results == [("s", 1, os.getpid()), ("s", 2, os.getpid()), ("s", 3, os.getpid())]
+
+    it "doesn't use more jobs than there are cpus", monkeypatch:
+        monkeypatch.setattr(os, "cpu_count", lambda: 1)
+        results = run_in_order(value_and_pid, [(1,), (2,), (3,)], jobs=4, shared="s")
+        assert results == [("s", 1, os.getpid()), ("s", 2, os.getpid()), ("s", 3, os.getpid())]
+
+    it "returns the results of workers in order", monkeypatch:
+        monkeypatch.setattr(os, "cpu_count", lambda: 4)
+        results = run_in_order(value_and_pid, [(i,) for i in range(10)], jobs=4, shared="s")
+        assert [(shared, value) for shared, value, _ in results] == [("s", i) for i in range(10)]
+        assert all(pid != os.getpid() for _, _, pid in results)
+
+    it "raises the error from the worker without calling again", monkeypatch:
+        monkeypatch.setattr(os, "cpu_count", lambda: 4)
+        with thp.a_temp_dir() as directory:
+            with assertRaises(ValueError, "Failed on 2"):
+                run_in_order(record_and_fail, [(i,) for i in range(4)], jobs=2, shared=directory)
+
+            with open(os.path.join(directory, "2")) as fle:
+                pids = fle.read().split()
+            assert len(pids) == 1
+            assert pids[0] != str(os.getpid())
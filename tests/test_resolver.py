@@ -0,0 +1,192 @@
+# coding: spec
+
+from photons_messages_generator.resolver import Resolver, SymbolIndex, Pass, schedule
+from photons_messages_generator.generate import generate_to_memory, normalise
+from photons_messages_generator.adjustments import Adjustments
+from photons_messages_generator.fast_src import FastSrc
+from photons_messages_generator.src import CloneStruct
+
+from delfick_project.norms import Meta
+from ruamel.yaml import YAML
+from types import SimpleNamespace
+import pytest
+
+
+def names(traversals):
+    return [[p.name for p in traversal] for traversal in traversals]
+
+
+def resolver_passes():
+    return Resolver(FastSrc([], [], [], []), None).passes()
+
+
+def make_pass(name, kind, **kwargs):
+    def run(*args):
+        pass
+
+    run.__name__ = name
+    return Pass(run, kind, **kwargs)
+
+
+describe "SymbolIndex":
+    it "keeps the first of things with the same name":
+        first, second, other = [SimpleNamespace(full_name=name) for name in ("A", "A", "B")]
+        for attr, position in (("enums", 0), ("unions", 1), ("groups", 2), ("packets", 3)):
+            lists = [[], [], [], []]
+            lists[position] = [first, second, other]
+            index = SymbolIndex(FastSrc(*lists))
+
+            name = {"groups": "structs"}.get(attr, attr)
+            assert getattr(index, name) == {"A": first, "B": other}, attr
+
+    it "swaps clone placeholders for the generated clone":
+        src = """
+            fields:
+              Colour:
+                size_bytes: 2
+                fields:
+                  - name: "Hue"
+                    type: "uint16"
+                    size_bytes: 2
+
+            packets:
+              one:
+                OneSetColour:
+                  pkt_type: 1
+                  size_bytes: 2
+                  fields:
+                    - name: "Colour"
+                      type: "<Colour>"
+                      size_bytes: 2
+        """
+
+        adjustments = """
+            num_reserved_fields_in_frame: 3
+
+            clones:
+              colour_optionals:
+                cloning: Colour
+
+            changes:
+              OneSetColour:
+                fields:
+                  Colour:
+                    override_struct: colour_optionals
+        """
+
+        src = normalise(YAML(typ="safe").load(src))
+        adjustments = Adjustments.FieldSpec().normalise(
+            Meta({}, []).at("adjustments"), YAML(typ="safe").load(adjustments)
+        )
+        resolver = Resolver(src, adjustments)
+        resolver.resolve()
+
+        clone = resolver.symbols.structs["colour_optionals"]
+        assert not isinstance(clone, CloneStruct)
+        assert clone in src.groups
+        assert [field.name for field in clone.item_fields] == ["hue"]
+        assert src.packets[0].item_fields[0].type.struct is clone
+
+
+describe "Scheduling resolver passes":
+    it "puts passes that don't depend on each other in one traversal":
+        passes = [
+            make_pass("one", "field"),
+            make_pass("two", "parent", reports=True),
+            make_pass("three", "packet"),
+            make_pass("four", "global"),
+            make_pass("five", "field"),
+        ]
+        assert names(schedule(passes)) == [["one", "two", "three"], ["four"], ["five"]]
+
+    it "starts a new traversal for a pass that depends on the current one":
+        passes = [
+            make_pass("one", "field"),
+            make_pass("two", "field"),
+            make_pass("three", "field", after=["one"]),
+        ]
+        assert names(schedule(passes)) == [["one", "two"], ["three"]]
+
+    it "only lets one pass per traversal report":
+        passes = [
+            make_pass("one", "field", reports=True),
+            make_pass("two", "field"),
+            make_pass("three", "parent", reports=True),
+        ]
+        assert names(schedule(passes)) == [["one", "two"], ["three"]]
+
+    it "fuses the passes of the resolver":
+        traversals = names(schedule(resolver_passes()))
+        assert len(traversals) < len(resolver_passes())
+        assert ["resolve_namespaces", "resolve_field_extras", "resolve_types"] in traversals
+
+    @pytest.mark.parametrize("p", resolver_passes(), ids=lambda p: p.name)
+    it "only depends on passes that come before it", p:
+        earlier = []
+        for other in resolver_passes():
+            if other.name == p.name:
+                break
+            earlier.append(other.name)
+        assert all(name in earlier for name in p.after)
+
+describe "Comparing duplicate packets":
+    src = """
+        packets:
+          one:
+            OneSetThing:
+              pkt_type: 1
+              size_bytes: 2
+              fields:
+                - name: "Value"
+                  type: "uint16"
+                  size_bytes: 2
+            OneStateThing:
+              pkt_type: 2
+              size_bytes: 2
+              fields:
+                - name: "Value"
+                  type: "uint16"
+                  size_bytes: 2
+            OneOtherThing:
+              pkt_type: 3
+              size_bytes: 2
+              fields:
+                - name: "Value"
+                  type: "uint16"
+                  size_bytes: 2
+    """
+
+    def generate(self, changes, strict_duplicates):
+        adjustments = {
+            "num_reserved_fields_in_frame": 3,
+            "changes": changes,
+            "output": [
+                {"create": "enums", "dest": "enums.py"},
+                {"create": "fields", "dest": "fields.py"},
+                {"create": "packets", "dest": "messages.py", "options": {"include": "*"}},
+            ],
+        }
+        src = YAML(typ="safe").load(self.src)
+        generate_to_memory(src, adjustments, strict_duplicates=strict_duplicates)
+
+    def warnings(self, caplog):
+        return [r.getMessage() for r in caplog.records if "Two packets" in r.getMessage()]
+
+    it "says nothing when the packets resolve the same", caplog:
+        self.generate({}, strict_duplicates=True)
+        assert self.warnings(caplog) == []
+
+    it "warns about packets that resolve differently", caplog:
+        changes = {"OneStateThing": {"fields": {"Value": {"default": "1"}}}}
+
+        self.generate(changes, strict_duplicates=True)
+        found = self.warnings(caplog)
+        assert len(found) == 3
+        assert all("has differences in fields" in warning for warning in found)
+        assert all("StateThing" in warning for warning in found)
+
+    it "only compares duplicates when asked to", caplog:
+        changes = {"OneStateThing": {"fields": {"Value": {"default": "1"}}}}
+
+        self.generate(changes, strict_duplicates=False)
+        assert self.warnings(caplog) == []
@@ -0,0 +1,156 @@
+# coding: spec
+
+from photons_messages_generator.fast_src import normalise_src, fast_normalise, copy_src, Unexpected
+from photons_messages_generator.generate import generate_to_memory
+from photons_messages_generator.src import Src
+
+from delfick_project.norms import Meta
+from ruamel.yaml import YAML
+import pytest
+
+
+def load(content):
+    return YAML(typ="safe").load(content)
+
+
+def slow(val):
+    return Src.FieldSpec().normalise(Meta({}, []).at("src"), val)
+
+
+def assertSame(fast, slow):
+    for attr in ("enums", "unions", "groups", "packets"):
+        assert repr(getattr(fast, attr)) == repr(getattr(slow, attr))
+
+
+src = """
+enums:
+  SomeEnum:
+    type: uint8
+    values:
+      - name: "SOME_ENUM_ONE"
+        value: 1
+      - name: "reserved"
+        value: 2
+
+groups:
+  SomeStruct:
+    size_bytes: 3
+    fields:
+      - name: "One"
+        type: "<SomeEnum>"
+        size_bytes: 1
+      - type: "reserved"
+        size_bits: 8
+      - name: "Two"
+        type: "[2]bit"
+        size_bits: 2
+        default: "0"
+        extras: ["optional()"]
+      - type: "reserved"
+        size_bits: 6
+  Empty:
+    size_bytes: 0
+
+unions:
+  SomeUnion:
+    size_bytes: 4
+    fields:
+      - name: "Number"
+        type: "uint32"
+        size_bytes: 4
+
+packets:
+  one:
+    OneThing:
+      pkt_type: 1
+      size_bytes: 4
+      fields:
+        - name: "Thing"
+          type: "<SomeStruct>"
+          size_bytes: 3
+        - name: "Other"
+          type: "uint8"
+          size_bytes: 1
+    OneGet:
+      pkt_type: 2
+      size_bytes: 0
+      fields: []
+"""
+
+describe "Normalising src":
+    it "makes the same objects as the norms specs":
+        fast = fast_normalise(load(src))
+        assertSame(fast, slow(load(src)))
+
+        assert fast.groups[0].item_fields[1].size_bytes is not None
+        assert fast.packets[0].namespace == "one"
+
+    it "makes clones that don't share changes":
+        field = fast_normalise(load(src)).groups[0].item_fields[0]
+        clone = field.with_prefix(["thing_"])
+        assert clone.name == "thing_One"
+        assert field.name == "One"
+        assert repr(clone).replace("thing_One", "One") == repr(field)
+
+    it "falls back to the norms specs for values it doesn't understand":
+        val = load(src)
+        val["groups"]["SomeStruct"]["fields"][2]["extras"] = "optional()"
+        val["packets"]["one"]["OneThing"]["pkt_type"] = "1"
+
+        with pytest.raises(Unexpected):
+            fast_normalise(val)
+
+        normalised = normalise_src(val)
+        assert normalised.groups[0].item_fields[2].extras == ["optional()"]
+        assert normalised.packets[0].pkt_type == 1
+        assertSame(normalised, slow(load(src)))
+
+    @pytest.mark.parametrize("normalise", [fast_normalise, slow], ids=["fast", "slow"])
+    it "makes copies that can be resolved without changing the original", normalise:
+        original = normalise(load(src))
+        before = repr(original)
+
+        adjustments = {
+            "num_reserved_fields_in_frame": 3,
+            "changes": {"SomeEnum": {"rename": "Other"}},
+            "output": [
+                {"create": "enums", "dest": "enums.py"},
+                {"create": "fields", "dest": "fields.py"},
+                {"create": "packets", "dest": "messages.py", "options": {"include": "*"}},
+            ],
+        }
+        first = generate_to_memory(copy_src(original), adjustments)
+        assert repr(original) == before
+
+        assert generate_to_memory(copy_src(original), adjustments) == first
+        assert generate_to_memory(load(src), adjustments) == first
+
+    @pytest.mark.parametrize(
+        "change",
+        [
+            lambda v: v["enums"]["SomeEnum"].update(type="uint9"),
+            lambda v: v["enums"]["SomeEnum"]["values"][0].pop("value"),
+            lambda v: v["groups"]["SomeStruct"]["fields"][0].update(size_bits=8),
+            lambda v: v["groups"]["SomeStruct"]["fields"][0].pop("size_bytes"),
+            lambda v: v["groups"]["SomeStruct"]["fields"][0].pop("name"),
+            lambda v: v["groups"]["SomeStruct"]["fields"][1].update(name="Nope"),
+            lambda v: v["groups"]["SomeStruct"]["fields"][2].update(default=0),
+            lambda v: v["unions"]["SomeUnion"].pop("size_bytes"),
+            lambda v: v["packets"]["one"]["OneThing"].pop("fields"),
+            lambda v: v["packets"]["one"]["OneThing"].update(size_bytes=None),
+        ],
+    )
+    it "raises the same errors as the norms specs", change:
+        val = load(src)
+        change(val)
+
+        with pytest.raises(Exception) as expected:
+            slow(val)
+
+        val = load(src)
+        change(val)
+
+        with pytest.raises(type(expected.value)) as got:
+            normalise_src(val)
+
+        assert str(got.value) == str(expected.value)
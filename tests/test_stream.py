@@ -0,0 +1,116 @@
+# coding: spec
+
+from photons_messages_generator.generate import normalise, generate_to_memory
+from photons_messages_generator.stream import stream_src, stream_normalise
+from photons_messages_generator.fast_src import FastSrc, Unexpected
+from photons_messages_generator.loader import make_yaml
+
+from ruamel.yaml import YAML
+import pytest
+
+src = """
+enums:
+  SomeEnum:
+    type: uint8
+    values:
+      - name: "SOME_ENUM_ONE"
+        value: 1
+      - name: "reserved"
+        value: 0x2
+
+fields:
+  SomeStruct:
+    size_bytes: 3
+    fields:
+      - name: "One"
+        type: "<SomeEnum>"
+        size_bytes: 1
+      - type: "reserved"
+        size_bits: 8
+      - {name: "Two", type: "[2]bit", size_bits: 2, default: "0", extras: ["optional()"]}
+      - type: "reserved"
+        size_bits: 6
+
+unions:
+  SomeUnion:
+    size_bytes: 4
+    fields:
+      - name: "Number"
+        type: "uint32"
+        size_bytes: 4
+
+something_else:
+  - [1, 2, {three: 3}]
+
+packets:
+  one:
+    OneThing:
+      pkt_type: 1
+      size_bytes: 4
+      fields:
+        - name: "Thing"
+          type: "<SomeStruct>"
+          size_bytes: 3
+        - name: "Other"
+          type: "uint8"
+          size_bytes: 1
+    OneGet:
+      pkt_type: 2
+      size_bytes: 0
+      fields: []
+"""
+
+
+def load(content):
+    return YAML(typ="safe").load(content)
+
+
+describe "Streaming the src":
+    it "makes the same objects as loading all of it":
+        streamed = stream_src(src)
+        assert isinstance(streamed, FastSrc)
+        assert repr(streamed) == repr(normalise(load(src)))
+
+    it "generates the same files":
+        adjustments = {
+            "num_reserved_fields_in_frame": 3,
+            "output": [
+                {"create": "enums", "dest": "enums.py"},
+                {"create": "fields", "dest": "fields.py"},
+                {"create": "packets", "dest": "messages.py", "options": {"include": "*"}},
+            ],
+        }
+        assert generate_to_memory(stream_src(src), adjustments) == generate_to_memory(
+            load(src), adjustments
+        )
+
+    @pytest.mark.parametrize(
+        "content",
+        [
+            src.replace("    type: uint8", "    type: &t uint8"),
+            src.replace("size_bytes: 0", "size_bytes: !!int 0"),
+            src.replace("pkt_type: 2", 'pkt_type: "2"'),
+            src + "\ngroups: {}\n",
+            "",
+            "[1, 2]",
+        ],
+        ids=["anchor", "tag", "quoted", "fields and groups", "empty", "list"],
+    )
+    it "gives back the whole document for anything unusual", content:
+        with pytest.raises(Unexpected):
+            stream_normalise(make_yaml(), content)
+
+        assert stream_src(content) == load(content)
+
+    @pytest.mark.parametrize(
+        "content",
+        [src.replace("pkt_type: 2", "pkt_type: [2"), src.replace("  OneGet:", "  OneThing:")],
+        ids=["invalid", "duplicate"],
+    )
+    it "raises the same errors as loading all of it", content:
+        with pytest.raises(Exception) as expected:
+            load(content)
+
+        with pytest.raises(type(expected.value)) as got:
+            stream_src(content)
+        assert str(got.value) == str(expected.value)
@@ -1,6 +1,8 @@
 # coding: spec
 
+from photons_messages_generator.fast_src import Enum, EnumValue
 from photons_messages_generator import test_helpers as thp
+from photons_messages_generator import field_types as ft
 from photons_messages_generator import errors
 
 from delfick_project.errors_pytest import assertRaises
@@ -858,3 +860,28 @@ describe "Types":
             output.assertFileContents("enums.py", expected_enums)
             output.assertFileContents("fields.py", expected_fields)
             output.assertFileContents("messages.py", expected_messages)
+
+describe "Formatting types":
+    it "makes the same format for types with the same values":
+        one = ft.SimpleType("uint16", 2)
+        two = ft.SimpleType("uint16", 2)
+        assert one.format(32) == "T.Uint16.multiple(2)"
+        assert two.format(32) is one.format(32)
+
+        assert ft.SimpleType("byte", 1).format(64) == "T.Bytes(8 * 8)"
+
+    it "complains every time about a bad size":
+        for _ in range(2):
+            msg = "Expected size bytes to be divisible by multiple"
+            with assertRaises(errors.BadSizeBytes, msg, multiple=3, size_bits=16):
+                ft.SimpleType("uint8", 3).format(16)
+
+    it "knows the names of enum values once they've been renamed":
+        enum = Enum("SomeEnum", "SomeEnum", "uint8", [EnumValue("ONE", 1), EnumValue("TWO", 2)])
+        typ = ft.EnumType(enum, 1)
+        enum.values[1].name = "OTHER"
+
+        assert typ.value("OTHER") == "OTHER"
+        kwargs = {"available": ["ONE", "OTHER"], "enum": "SomeEnum", "wanted": "TWO"}
+        with assertRaises(errors.NoSuchEnumValue, **kwargs):
+            typ.value("TWO")
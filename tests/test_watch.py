@@ -0,0 +1,102 @@
+# coding: spec
+
+from photons_messages_generator.watch import (
+    MemoryDocuments,
+    PollingWatcher,
+    InotifyWatcher,
+    make_watcher,
+)
+from photons_messages_generator import test_helpers as thp
+
+import threading
+import pytest
+import time
+import os
+
+
+@pytest.fixture()
+def path():
+    with thp.a_temp_dir() as directory:
+        location = os.path.join(directory, "adjustments.yml")
+        with open(location, "w") as fle:
+            fle.write("one: 1\n")
+        yield location
+
+
+def change_later(path, content, delay=0.05):
+    def change():
+        time.sleep(delay)
+        with open(f"{path}.tmp", "w") as fle:
+            fle.write(content)
+        os.replace(f"{path}.tmp", path)
+
+    thread = threading.Thread(target=change)
+    thread.start()
+    return thread
+
+
+describe "MemoryDocuments":
+    it "gives a fresh copy of the document each time":
+        documents = MemoryDocuments()
+        assert documents.get("a") == (False, None)
+
+        documents.set("a", {"one": [1]})
+        found, document = documents.get("a")
+        assert found and document == {"one": [1]}
+
+        document["one"].append(2)
+        assert documents.get("a") == (True, {"one": [1]})
+
+    it "only keeps the most recent documents and asks the fallback for the rest":
+        fallback = MemoryDocuments(keep=10)
+        documents = MemoryDocuments(fallback=fallback, keep=2)
+        for key in ("a", "b", "c"):
+            documents.set(key, key)
+
+        assert list(documents.documents) == ["b", "c"]
+        assert documents.get("a") == (True, "a")
+        assert list(documents.documents) == ["c", "a"]
+
+describe "Watchers":
+
+    def assertNoticesChanges(self, watcher, path):
+        try:
+            assert not watcher.changed(0.1)
+
+            thread = change_later(path, "one: 2\n")
+            assert watcher.changed(2)
+            thread.join()
+
+            with open(os.path.join(os.path.dirname(path), "other.yml"), "w") as fle:
+                fle.write("two: 2\n")
+            assert not watcher.changed(0.2)
+        finally:
+            watcher.close()
+
+    it "can poll for changes", path:
+        self.assertNoticesChanges(PollingWatcher([path], interval=0.01), path)
+
+    it "can use inotify", path:
+        watcher = make_watcher([path])
+        if not isinstance(watcher, InotifyWatcher):
+            watcher.close()
+            pytest.skip("inotify isn't available")
+        self.assertNoticesChanges(watcher, path)
+
+    it "waits for the changes to settle", path:
+        watcher = PollingWatcher([path], interval=0.01)
+
+        def change():
+            for i in range(5):
+                time.sleep(0.05)
+                with open(path, "a") as fle:
+                    fle.write(f"# {i}\n")
+
+        thread = threading.Thread(target=change)
+        thread.start()
+        watcher.wait(0.2)
+        thread.join()
+
+        with open(path) as fle:
+            assert "# 4" in fle.read()
+        assert not watcher.changed(0)